@@ -101,6 +101,51 @@ print(text)
 
 # If running into troubles, you may find the full list of encodings supported in Python here: https://docs.python.org/3/library/codecs.html#standard-encodings
 
+# <h3> Converting encodings in bulk </h3>
+# 
+# Above, we had to know in advance that gazette.txt was encoded in ISO-8859-1, and we read the whole file in memory to convert it.  When a collection of files comes from many sources, we can instead guess the encoding from a sample of the first bytes:
+# <ul>
+# <li> A byte order mark (BOM) at the beginning of the file identifies the unicode encodings. </li>
+# <li> If the sample decodes as utf-8 without error, the file is almost certainly utf-8. </li>
+# <li> Otherwise, we ask the charset_normalizer library, if it is installed, and fall back on latin-1, which accepts any byte. </li>
+# </ul>
+# 
+# The conversion itself is done in chunks with <b>incremental</b> decoders from the codecs module.  They remember a character that is cut between two chunks, so that multibyte characters are not broken, and memory stays constant for files of any size.  When the source is already utf-8, the file is copied as is, but still decoded on the way: a file whose first bytes are plain ascii can hold a latin-1 character much further, and it is then converted from cp1252 (the Windows version of latin-1), or from latin-1 when cp1252 cannot decode the bytes from that character on.  A guess made from such a short stretch of accented text is unreliable, so we do not ask charset_normalizer for a rarer code page there.
+# 
+# The functions of the more advanced sections of this notebook are saved in the <b>pol2578</b> package, the folder of the same name next to this notebook, so that other programs can use them too.  We import them from there; open the files of the folder to read their code.  The functions for encodings are in pol2578/transcoding.py.
+
+# In[ ]:
+
+
+from pol2578.transcoding import detect_encoding, transcode
+
+
+# In[ ]:
+
+
+print(detect_encoding('gazette.txt'))
+transcode('gazette.txt', 'gazette_unicode.txt')
+
+with open('gazette_unicode.txt', encoding='utf-8') as f:
+    print(f.read())
+
+
+# A whole directory can be converted in parallel, one file per process.  We will come back to process pools later in the course.  The function returns the detected encoding of each file, or the error raised.
+
+# In[ ]:
+
+
+import glob
+import os
+from pol2578.transcoding import transcode_directory
+
+
+# In[ ]:
+
+
+transcode_directory(os.getcwd(), 'texts_unicode')
+
+
 # <h2> Data types </h2>
 # 
 # The most common data types in programming are:
@@ -606,6 +651,28 @@ for i, score in enumerate(sentscores):
     print(f"Sentence {i+1} has a sentiment score of: {score:0.3f}.")
 
 
+# The loop above looks up every word in the dictionary, one at a time, and then scans each list twice to count the positive and negative words.  This is fine for two sentences, but too slow for millions of documents.
+# 
+# With the <b>numpy</b> library, we can instead work on whole arrays at once.  The idea is to give each distinct word an integer code (with pandas.factorize), to look up the polarity of each distinct word only once, and then to count the positive and negative words of every document with np.bincount.  Documents are processed in chunks, so that the token arrays stay small.  The function is score_corpus, in pol2578/text.py.
+
+# In[ ]:
+
+
+import numpy as np
+import pandas as pd
+from pol2578.text import score_corpus
+
+
+# The result is an array aligned with the documents, identical to the loop:
+
+# In[ ]:
+
+
+vectorized_scores = score_corpus([s1, s2], sentiment)
+print(vectorized_scores)
+print(vectorized_scores.tolist() == sentscores)
+
+
 # <h3> Data Frames </h3>
 # 
 # R users may be familiar with the data frame type, which is a spreadsheet-like arrangement of a dataset.
@@ -929,6 +996,93 @@ johnny.word_transform('Canada')
 johnny.print_name()
 
 
+# <h3> A reusable word filter </h3>
+# 
+# Now that we know about classes, we can improve the remove_words function from above.  It has two problems.  First, it rebuilds its list of words every time it is called.  Second, testing whether a word is <i>in</i> a list means comparing it with every element of the list, which gets slow with long lists of stopwords.
+# 
+# The WordFilter class, in pol2578/text.py, is built once from a list of words.  It stores the single words in a <b>frozenset</b>, where a lookup takes the same time no matter how many words it contains.  Expressions of several words, such as "House of Commons", are stored in a tree of dictionaries keyed by their tokens, so that we can recognize the longest expression starting at each position.
+
+# In[ ]:
+
+
+from pol2578.text import WordFilter
+
+
+# In[ ]:
+
+
+word_filter = WordFilter(['Canada','bill','government','law'])
+print(word_filter(x))
+print(word_filter(x) == remove_words(x))
+
+
+# In[ ]:
+
+
+procedure_filter = WordFilter(['House of Commons', 'the House', 'hon.', 'Member'])
+procedure_filter.batch(['I thank the hon. Member for his question.',
+                        'The House of Commons will now adjourn.'])
+
+
+# Let's compare the speed of both approaches, first with the four words of remove_words, then with a list of 5,000 words.  The time taken by WordFilter does not depend on the length of the list.
+
+# In[ ]:
+
+
+import time
+
+documents = [x] * 2000
+
+start = time.perf_counter()
+for document in documents:
+    remove_words(document)
+print(f"remove_words: {time.perf_counter() - start:0.3f} seconds.")
+
+start = time.perf_counter()
+word_filter.batch(documents)
+print(f"WordFilter: {time.perf_counter() - start:0.3f} seconds.")
+
+stopwords = [f"word{i}" for i in range(5000)] + ['bill', 'government']
+big_filter = WordFilter(stopwords)
+
+start = time.perf_counter()
+for document in documents:
+    ' '.join([w for w in document.split() if w not in stopwords])
+print(f"list of 5,000 words: {time.perf_counter() - start:0.3f} seconds.")
+
+start = time.perf_counter()
+big_filter.batch(documents)
+print(f"WordFilter with 5,000 words: {time.perf_counter() - start:0.3f} seconds.")
+
+
+# Cleaning a text usually takes several steps: converting it to lowercase (as johnny.word_transform does), replacing HTML entities such as &amp;amp; with html.unescape, removing words, and removing white space with strip().  Chaining the calls works, but each step goes through the whole text again, and each word filter splits the text into words and joins them back.
+# 
+# The TextPipeline class of pol2578/text.py takes the list of steps once, and writes (<i>compiles</i>) a single function that does all of them.  Consecutive word filters share one list of words, strip() is skipped when the text cannot start or end with a space, and html.unescape is only called on texts that contain '&amp;'.  The result is the same as the chained calls.
+
+# In[ ]:
+
+
+import html
+from pol2578.text import TextPipeline
+
+tweets_to_clean = ['Canada &amp; the bill:  GOOD news ', '  The government &lt;3 the LAW'] * 20000
+
+def clean_chained(text):
+    return word_filter(big_filter(html.unescape(johnny.word_transform(text)))).strip()
+
+pipeline = TextPipeline([str.lower, html.unescape, big_filter, word_filter, str.strip])
+print(pipeline.source)
+print(pipeline.batch(tweets_to_clean) == [clean_chained(text) for text in tweets_to_clean])
+
+start = time.perf_counter()
+[clean_chained(text) for text in tweets_to_clean]
+print(f"chained calls: {time.perf_counter() - start:0.3f} seconds.")
+
+start = time.perf_counter()
+pipeline.batch(tweets_to_clean)
+print(f"TextPipeline: {time.perf_counter() - start:0.3f} seconds.")
+
+
 # <h3> Handling common file formats for textual data </h3>
 # 
 # We've seen how to load a text file and spreadsheet-like files, two common formats.  But there are other formats used to store and disseminate textual data.  These are:
@@ -1029,6 +1183,156 @@ print(speakernames[0])
 print(speeches[0].strip())
 
 
+# <h4> Measuring where the time goes </h4>
+# 
+# Before working with large files, let's import a small tool, from pol2578/profiling.py, to find out which step of a pipeline takes the most time: reading the file, decoding the JSON, navigating the xml tree, writing the output, etc.  The functions that follow mark their main steps with profiler.stage(name).  When the profiler is turned on, each stage counts its calls, the number of bytes it processed, the elapsed (wall) time and the CPU time.  Stages can be nested: the time of a stage minus the time of its sub-stages is its <i>self</i> time.
+# 
+# When the profiler is off, stage() returns a context manager that does nothing, and instrument() returns the function unchanged, so the cost is negligible.
+
+# In[ ]:
+
+
+from pol2578.profiling import profiler
+
+
+# <h4> Streaming large XML files </h4>
+# 
+# The etree.parse approach loads the whole document in memory before we can use it.  This is fine for a single sitting, but the full proceedings dumps can weigh several gigabytes.  For those, we can use <b>iterparse</b>, which reads the file progressively and gives us each element as soon as its closing tag has been read.
+# 
+# The function iter_speeches, in pol2578/speeches.py, is a <b>generator</b>: it uses yield instead of return, and produces one (speaker, speech) pair at a time.  Once a speech has been consumed, we clear it and delete the elements that came before it, so that memory stays flat no matter the size of the file.
+
+# In[ ]:
+
+
+from pol2578.speeches import iter_speeches
+
+
+# Since the function yields results one by one, we can loop over it directly.  The speeches are the same as above, except for the white space following the closing tag, which iterparse has not read yet when the speech is returned.
+
+# In[ ]:
+
+
+speakernames = []
+speeches = []
+
+for name, speech in iter_speeches('uk.proc.d.2013-12-11.xml'):
+    speakernames.append(name)
+    speeches.append(speech)
+
+print(len(speeches))
+print(speakernames[0])
+print(speeches[0].strip())
+
+
+# We can compare the speed of both approaches with the time module.  The streaming version is not slower, since it skips the xpath queries.
+
+# In[ ]:
+
+
+import time
+
+start = time.perf_counter()
+with open('uk.proc.d.2013-12-11.xml', encoding='utf-8') as f:
+    parsedf = etree.parse(f)
+for s in parsedf.xpath('.//pm:speech', namespaces=ns):
+    speech = etree.tostring(s,method="text",encoding="unicode",pretty_print=True)
+    name = s.xpath('@pm:speaker',namespaces=ns)[0]
+print(f"etree.parse: {time.perf_counter() - start:0.3f} seconds.")
+
+start = time.perf_counter()
+for name, speech in iter_speeches('uk.proc.d.2013-12-11.xml'):
+    pass
+print(f"iterparse: {time.perf_counter() - start:0.3f} seconds.")
+
+
+# <h4> Keeping the metadata of each speech </h4>
+# 
+# The speech tags contain more than the name of the speaker.  They also have the party, the role, a reference to the member and a unique identifier.  The enclosing topic and scene tags give the titles of the debates.  Rather than running one xpath query per attribute, we can read them directly with the get method of each element, in the same pass.
+# 
+# To store the results, we keep one list per variable instead of one tuple per speech.  This is called a <b>columnar</b> layout, and it is the layout that pandas and Arrow use internally, so the conversion to a data frame is done one column at a time rather than one row at a time.  The SpeechTable class and the read_speeches function are also in pol2578/speeches.py.
+
+# In[ ]:
+
+
+from pol2578.speeches import SpeechTable, read_speeches
+
+
+# Missing attributes, for instance the party of the Speaker of the House, are stored as None.
+# 
+# A few columns, such as the party, the role and the titles of the debates, take the same few values over and over.  to_pandas turns them into <b>categorical</b> columns, and to_arrow into <b>dictionary</b> arrays: each distinct value is stored once, and each speech only keeps a small integer code.  This saves memory, and grouping by these columns is faster.
+
+# In[ ]:
+
+
+speech_table = read_speeches('uk.proc.d.2013-12-11.xml')
+df = speech_table.to_pandas()
+df.head()
+
+
+# In[ ]:
+
+
+df.groupby('party').size()
+
+
+# <h4> Searching the speeches </h4>
+# 
+# To find the speeches that mention a word, we could loop over all of them and test each one.  With thousands of queries on a large corpus, it is much faster to build an <b>inverted index</b> once: for each word, the list of speeches that contain it, and the positions where it appears.  Queries then only read the lists of the words they contain.  Positions let us search for exact phrases, such as "the Government", by checking that the words follow each other.
+# 
+# The SpeechIndex class of pol2578/search.py stores the lists in compressed form on disk, with the metadata of each speech.  A query combines words and quoted phrases with AND (implicit between terms), OR, NOT and parentheses, and metadata columns can filter the results.
+
+# In[ ]:
+
+
+import shutil
+from pol2578.search import SpeechIndex
+
+shutil.rmtree('speech_index', ignore_errors=True)
+speech_index = SpeechIndex('speech_index')
+speech_index.add(speech_table)
+len(speech_index), len(speech_index.vocabulary)
+
+
+# In[ ]:
+
+
+found = speech_index.search('"the Government" AND (tax OR taxes) NOT Labour')
+speech_index.metadata(found)[['speaker', 'party', 'topic']]
+
+
+# In[ ]:
+
+
+found = speech_index.search('"civil service"', party='Conservative')
+print(len(found))
+speech_table.data['text'][found[0]].strip()[:300]
+
+
+# <h4> Building a corpus from many sittings </h4>
+# 
+# Each xml file in the dataset contains a single sitting.  To build a corpus, we need to process thousands of them.  Since the files are independent, we can split the work across the cores of the computer with a <b>process pool</b> from the concurrent.futures module.
+# 
+# The worker function, extract_sitting, processes one file and reports how long it took.  It catches errors instead of raising them, so that a malformed file does not stop the whole run.
+
+# In[ ]:
+
+
+from pol2578.speeches import build_corpus
+
+
+# The corpus is a SpeechTable with the speeches of all sittings, and the report has one line per file.  By default, the pool uses one process per core.
+# 
+# Note that on Windows and Mac OS, new processes do not inherit the functions defined in a notebook.  Since build_corpus and its worker function are imported from a file, they work there too.
+
+# In[ ]:
+
+
+corpus, report = build_corpus(default_path)
+
+print(len(corpus))
+pd.DataFrame(report, columns=['sitting', 'speeches', 'seconds', 'error'])
+
+
 # <h4> Parsing HTML </h4>
 # 
 # Parsing html files follows the same steps.  However, we normally won't have to care about namespaces.  The usage of tags follows standard conventions.  For instance, the text content of a website is usually located within the &lt;body&gt; tag and may have &lt;p&gt; tags interspersed.  Or we may want to extract items from a list contained within the common &lt;ol&gt; or &lt;ul&gt; tags.  As with xml, the data may be malformed. 
@@ -1071,6 +1375,67 @@ library_text = [line for line in library_text if line.strip()!='']
 library_text
 
 
+# Beautiful Soup builds a tree of Python objects for the whole page, which is slow when we need to process hundreds of thousands of pages.  If we know which element we want, lxml can do the same job much faster.  With iterparse, we can also stop reading the page as soon as the element has been closed.
+# 
+# The generator iter_element_lines, in pol2578/articles.py, yields the cleaned lines of each element matching a tag and a dictionary of attributes, like soup.find.  Like getText, it leaves out the content of &lt;script&gt; and &lt;style&gt; tags and of comments.  Since it is a generator, parsing stops as soon as we stop asking for results: next() gives us the first match only.
+
+# In[ ]:
+
+
+from pol2578.articles import extract_article
+
+
+# In[ ]:
+
+
+fast_library_text = extract_article('about_library.html', 'article', {"about" : "/about"})
+print(fast_library_text == library_text)
+
+
+# In[ ]:
+
+
+start = time.perf_counter()
+for i in range(20):
+    with open('about_library.html', 'r', encoding='utf-8') as f:
+        soup = BeautifulSoup(f, 'lxml')
+    lines = soup.find('article', {"about" : "/about"}).getText().split('\n')
+    lines = [line for line in lines if line.strip()!='']
+print(f"BeautifulSoup: {time.perf_counter() - start:0.3f} seconds.")
+
+start = time.perf_counter()
+for i in range(20):
+    lines = extract_article('about_library.html', 'article', {"about" : "/about"})
+print(f"lxml iterparse: {time.perf_counter() - start:0.3f} seconds.")
+
+
+# <h4> Extracting articles from many pages </h4>
+# 
+# To process a whole crawl, we can distribute the pages over a process pool, as we did for the xml sittings.  Web pages are often malformed, and a few of them can make a parser extremely slow or use a lot of memory.  On Linux and Mac OS, two tools from the operating system let us protect the run:
+# <ul>
+# <li> signal.setitimer sends an alarm to the worker after a given number of seconds.  We turn the alarm into an exception, which interrupts the page. </li>
+# <li> resource.setrlimit caps the memory that a worker process can allocate.  Going over the cap raises a MemoryError. </li>
+# </ul>
+# 
+# The Beautiful Soup code from above becomes soup_article_lines, the function run on each page by default.  Any other function with the same arguments, such as extract_article, can be used instead.
+# 
+# The function accepts a directory or a list of files.  It returns two lists: the records of the pages that worked, as (path, lines, seconds) tuples, and the errors, as (path, seconds, error) tuples.  The memory cap is in bytes, and applies to each worker as a whole.  It must leave room for Python and the libraries, so a value under a few hundred megabytes will make every page fail.
+
+# In[ ]:
+
+
+from pol2578.articles import extract_articles
+
+
+# In[ ]:
+
+
+records, errors = extract_articles(['about_library.html', 'missing.html'], attrs={"about" : "/about"},
+                                   timeout=5, max_memory=2*1024**3)
+print(records[0][1] == library_text)
+errors
+
+
 # <h4>The JSON format</h4>
 # 
 # JSON, on the other hand, is very simple.  It is simply a dictionary.  If you have multiple lines with one tweet in JSON format per line, load all the file, split the lines, and then parse the JSON objects.
@@ -1185,8 +1550,8 @@ with open('my_tweets.csv', 'w', encoding='utf-8', newline='') as fout:
 # In[ ]:
 
 
-def tweet_parser(tweet_object):
-    tweet = json.loads(tweet_object)
+def tweet_parser(tweet_object, loads=json.loads):
+    tweet = loads(tweet_object)
     if 'retweeted_status' in tweet:
         if 'extended_tweet' in tweet['retweeted_status']:
             text = tweet['retweeted_status']['extended_tweet']['full_text']
@@ -1211,6 +1576,489 @@ for line in tweet_stream:
         print(html.unescape(text))
 
 
+# <h4> Faster JSON decoding </h4>
+# 
+# On large archives of tweets, most of the time is spent in json.loads, which converts the full tweet into Python dictionaries even though we only need two or three fields.  The tweet_parser function takes the decoder as an optional argument, so we can swap in a faster library when one is installed:
+# <ul>
+# <li> <b>simdjson</b> (pip install pysimdjson) parses lazily: values are only converted to Python objects when we access them. </li>
+# <li> <b>orjson</b> decodes the full object, but much faster than the standard library. </li>
+# </ul>
+# 
+# The function get_json_loads, in pol2578/tweets.py, returns the fastest decoder available, and falls back on the json module otherwise.
+
+# In[ ]:
+
+
+from pol2578.tweets import get_json_loads
+
+
+# All decoders give exactly the same output:
+
+# In[ ]:
+
+
+fast_loads = get_json_loads()
+
+tweets = [tweet_parser(line) for line in tweet_stream if line]
+fast_tweets = [tweet_parser(line, loads=fast_loads) for line in tweet_stream if line]
+print(fast_loads)
+print(tweets == fast_tweets)
+
+
+# A small benchmark, repeating the sample to get measurable times:
+
+# In[ ]:
+
+
+lines = [line for line in tweet_stream if line] * 200
+
+for backend in ['json', 'orjson', 'simdjson']:
+    try:
+        loads = get_json_loads(backend)
+    except ImportError:
+        print(f"{backend} is not installed.")
+        continue
+    start = time.perf_counter()
+    for line in lines:
+        tweet_parser(line, loads=loads)
+    elapsed = time.perf_counter() - start
+    print(f"{backend}: {len(lines) / elapsed:0.0f} tweets per second.")
+
+
+# <h4> Streaming large tweet files </h4>
+# 
+# Reading the file with f.read().splitlines() keeps two copies of the whole file in memory, and nothing is parsed until the full file has been read.  A file object can instead be iterated line by line, which reads the file in blocks behind the scenes.  The generator iter_tweet_batches, in pol2578/tweets.py, parses the tweets as the lines come in, and yields them in batches of a fixed size, so that memory use stays constant.
+# 
+# Large archives are usually compressed.  The gzip, bz2 and lzma modules can open those files directly, and decompress them on the fly without writing anything to disk.  We recognize the format from the first bytes of the file (the "magic number") rather than from its extension.
+
+# In[ ]:
+
+
+import gzip
+from pol2578.tweets import iter_tweet_batches
+
+
+# The lines are kept as bytes: all the JSON decoders accept bytes, and skipping the conversion to strings saves time.
+
+# In[ ]:
+
+
+with open('tweets-sample.txt', 'rb') as f, gzip.open('tweets-sample.txt.gz', 'wb') as fout:
+    fout.write(f.read())
+
+for batch in iter_tweet_batches('tweets-sample.txt.gz', batch_size=2, loads=fast_loads):
+    print(len(batch), [user for user, text in batch])
+
+
+# <h4> Parsing tweets on all cores </h4>
+# 
+# Even with a fast decoder, a single core can only parse so many tweets per second.  Since there is one tweet per line, an uncompressed file can be cut into chunks of bytes that we give to different processes.  The only subtlety is that a chunk must not cut a line in the middle: after jumping ahead by chunk_size bytes, we read until the end of the current line.
+# 
+# The chunks are submitted to the pool a few at a time: we never keep more than max_pending chunks in flight, and we wait for the oldest one before submitting a new one.  This keeps memory bounded, and the results come out in the same order as in the file.
+
+# In[ ]:
+
+
+from pol2578.tweets import parse_tweets_parallel
+
+
+# To try it, we create a larger file by repeating the sample.  Compressed files cannot be cut at arbitrary bytes; use iter_tweet_batches for those.
+
+# In[ ]:
+
+
+with open('tweets-sample.txt', 'rb') as f:
+    sample = f.read()
+with open('tweets-large.txt', 'wb') as fout:
+    for i in range(200):
+        fout.write(sample)
+
+start = time.perf_counter()
+ntweets = parse_tweets_parallel('tweets-large.txt', 'my_tweets_large.csv', chunk_size=1024*1024)
+print(f"{ntweets} tweets in {time.perf_counter() - start:0.2f} seconds.")
+
+
+# <h4> Random access with memory maps </h4>
+# 
+# All the readers so far go through the file from the beginning.  To get one tweet in the middle of an archive, or to come back to a speech we found earlier, we can instead <b>map</b> the file in memory with the mmap module.  The operating system then loads the parts of the file that we touch, on demand, and the content is never copied into Python strings.
+# 
+# The classes of pol2578/mapped.py find the offsets of every line (or speech) once, and then give the Nth record in constant time.  A line comes as a memoryview, a window on the mapped file that orjson and simdjson can decode directly.
+
+# In[ ]:
+
+
+from pol2578.mapped import MappedTweets, MappedSpeeches
+
+with MappedTweets('tweets-large.txt') as mapped_tweets:
+    print(len(mapped_tweets))
+    print(mapped_tweets[500])
+    print(mapped_tweets.file.starts[:5])
+
+
+# The speeches of the sitting can be accessed in the same way, in any order.  Each speech is parsed on its own, and gives the same result as iter_speeches.
+
+# In[ ]:
+
+
+with MappedSpeeches('uk.proc.d.2013-12-11.xml') as mapped_speeches:
+    print(len(mapped_speeches))
+    name, speech = mapped_speeches[42]
+    print(name)
+    print(speech.strip()[:200])
+    print(list(mapped_speeches) == list(iter_speeches('uk.proc.d.2013-12-11.xml')))
+
+
+# <h4> An index of a tweet archive </h4>
+# 
+# The offsets of a memory map are lost when we close it.  To look up tweets by id, by author or by date in a large archive, the TweetIndex class of pol2578/archive.py saves them in a small <b>sqlite</b> database next to the file, with the id, the screen name and the creation time of each tweet.  The archive is parsed once; later, update() only reads the lines added since the last update, which suits archives that grow every day.  A lookup reads one line of the archive, which we can give to tweet_parser.
+
+# In[ ]:
+
+
+from pol2578.archive import TweetIndex
+
+tweet_index = TweetIndex('tweets-sample.txt')
+print(tweet_index.update(), 'tweets indexed')
+print(tweet_parser(tweet_index.get(778335731198550016)))
+print([tweet_parser(line)[0] for line in tweet_index.between('2016-09-20 20:51', '2016-09-20 20:52')])
+print(tweet_index.update(), 'new tweets')
+tweet_index.close()
+
+
+# <h4> Columnar output with Parquet and Arrow </h4>
+# 
+# CSV files are convenient, but they are slow to write and to read back, since every value is converted to text and then parsed again by pandas.  For tens of millions of rows, a better option is the <b>Parquet</b> format, or its sibling <b>Feather</b> (the Arrow file format), available with the pyarrow library.  Both store the data by column, in compressed binary blocks.
+# 
+# The function write_batches, in pol2578/columnar.py, collects rows into batches of a fixed size, converts each batch into an Arrow record batch, and appends it to the output file.  For Parquet, each batch becomes a row group.  Only one batch is held in memory at a time.
+
+# In[ ]:
+
+
+import pyarrow as pa
+from pol2578.columnar import write_batches
+
+
+# We can use it with the tweet parser, passing a generator so that the tweets are never all in memory at once.
+
+# In[ ]:
+
+
+rows = ((user, html.unescape(text)) for user, text in map(tweet_parser, filter(None, tweet_stream)))
+write_batches(rows, 'my_tweets.parquet', ('user', 'tweet'))
+
+
+# pandas reads Parquet files directly.  With memory_map=True, the file is mapped in memory rather than copied into a buffer first.
+
+# In[ ]:
+
+
+df = pd.read_parquet('my_tweets.parquet', memory_map=True)
+df
+
+
+# The spreadsheet example from earlier can be stored in the same way.  Feather files written without compression can be loaded with zero copy: the data frame columns point directly to the memory-mapped file.
+
+# In[ ]:
+
+
+with open('example.txt', encoding='utf-8') as f:
+    text = f.read().splitlines()
+
+dataset = zip(document_numbers, text, document_tags)
+write_batches(dataset, 'example_spreadsheet.feather', ('docnumber', 'text', 'values'),
+              compression=None, file_format='feather')
+
+
+# In[ ]:
+
+
+with pa.memory_map('example_spreadsheet.feather') as source:
+    df = pa.ipc.open_file(source).read_all().to_pandas()
+df
+
+
+# <h4> Storing retweeted texts once </h4>
+# 
+# tweet_parser returns the full text of the original tweet for every retweet.  When a tweet goes viral, the same text is then written, and unescaped, tens of thousands of times.  The RetweetStore class of pol2578/tweets.py keeps the ids of the tweets already retweeted: a retweet only gets the id of the original tweet in the retweet_of column, and the text of the original is written once, to a second file.
+
+# In[ ]:
+
+
+from pol2578.tweets import parse_tweets_deduplicated
+
+print(parse_tweets_deduplicated('tweets-large.txt', 'my_tweets_large_dedup.csv', 'my_retweeted_texts.csv'))
+print(os.path.getsize('my_tweets_large.csv'))
+print(os.path.getsize('my_tweets_large_dedup.csv') + os.path.getsize('my_retweeted_texts.csv'))
+
+
+# The full texts are recovered by looking up the id of each retweet in the second file:
+
+# In[ ]:
+
+
+dedup = pd.read_csv('my_tweets_large_dedup.csv')
+retweeted = pd.read_csv('my_retweeted_texts.csv').set_index('id')['tweet']
+dedup['tweet'] = dedup['tweet'].fillna(dedup['retweet_of'].map(retweeted))
+dedup.head()
+
+
+# <h4> Extracting many fields at once </h4>
+# 
+# tweet_parser only returns the author and the text.  A tweet holds much more: its id, its time, the hashtags, the mentioned users and the links it contains, the tweet it replies to...  Writing one more function for each new field means decoding every line again.
+# 
+# The TweetProjection class of pol2578/projection.py takes instead a list of fields, each with its <b>path</b> in the tweet (keys separated by dots, and [] to go through a list) and its type.  A field can have several paths, tried in order, as tweet_parser does for the text of retweets and extended tweets.  The list is turned once into a single function that reads all the fields from each decoded tweet, and the values are stored by column, in typed Arrow arrays.  TWEET_FIELDS is a ready-made list of the most common fields.
+
+# In[ ]:
+
+
+from pol2578.projection import TWEET_FIELDS, TweetProjection
+
+for field in TWEET_FIELDS[:5]:
+    print(field)
+
+projection = TweetProjection()
+tweet_fields = projection.read('tweets-sample.txt')
+print(tweet_fields.schema)
+tweet_fields.to_pandas()
+
+
+# We can also write our own list of fields, and save them to a Parquet file:
+
+# In[ ]:
+
+
+my_fields = [('id', 'id', 'int64'),
+             ('user', 'user.screen_name', 'string'),
+             ('followers', 'user.followers_count', 'int64'),
+             ('mentions', 'entities.user_mentions[].screen_name', 'list<string>')]
+TweetProjection(my_fields).write('tweets-large.txt', 'my_tweet_fields.parquet')
+pd.read_parquet('my_tweet_fields.parquet').head()
+
+
+# <h4> Reading a live feed of tweets </h4>
+# 
+# Tweets do not always come from a file: a collection script can also send them, one JSON object per line, through a network connection (a <b>socket</b>) or a pipe, as they are posted.  The consumer then has to keep up with the feed, and it must not store more and more tweets in memory when the disk or the parser is slower than the feed.
+# 
+# The consume function of pol2578/stream.py uses the <b>asyncio</b> module: while it waits for data from the connection, the same thread can hand the batches already received to a pool of processes, which run tweet_parser, and write the parsed batches to disk.  The number of batches in progress is bounded: when it is reached, the consumer stops reading, and the sender has to wait.
+# 
+# To try it, start_replay_server serves tweets-sample.txt to each client that connects, as if the tweets were arriving live.  Both run in the same event loop.  Jupyter already runs an event loop of its own, so we start ours in a separate thread.
+
+# In[ ]:
+
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from pol2578.stream import consume, start_replay_server
+
+async def replay_sample(output):
+    server = await start_replay_server('tweets-sample.txt', repeat=2000)
+    port = server.sockets[0].getsockname()[1]
+    async with server:
+        return await consume(f'tcp://127.0.0.1:{port}', output)
+
+with ThreadPoolExecutor(1) as thread:
+    print(thread.submit(asyncio.run, replay_sample('my_tweets_stream.csv')).result())
+pd.read_csv('my_tweets_stream.csv').tail()
+
+
+# From a terminal, the same test is run with two commands: <code>pol2578 replay tweets-sample.txt --port 9000 --repeat 1000</code>, and in another terminal, <code>pol2578 stream tcp://127.0.0.1:9000 -o tweets.csv</code>.
+
+
+# <h4> Document-term matrices </h4>
+# 
+# Once we have extracted speeches or tweets, the next step of an analysis is often a <b>document-term matrix</b>: one row per document, one column per word, and the number of times the word appears in the document in each cell.  Most cells are zeros, so the matrix is stored in a <b>sparse</b> format, here the CSR format of the scipy library, which keeps only the non-zero values.
+# 
+# The StreamingVectorizer class of pol2578/vectorize.py reads the documents from a generator, and writes the matrix in chunks of rows, one file per chunk, so that the documents never have to be in memory all at once.  There are two ways to assign a column to each word:
+# <ul>
+# <li> with a <b>frozen vocabulary</b>, a dictionary built beforehand from a sample of documents, for instance with build_vocabulary; words not in the dictionary are ignored; </li>
+# <li> with <b>feature hashing</b>: the column is computed from the word itself, with a hash function, modulo the number of columns.  No dictionary is needed, at the price of a few words sharing the same column. </li>
+# </ul>
+# Either way, the column of a word does not depend on the other documents, so chunks written by different processes can be stacked into a single matrix.
+
+# In[ ]:
+
+
+from pol2578.vectorize import StreamingVectorizer, build_vocabulary, merge_chunks, tweet_texts
+
+lowercase = TextPipeline(['lower'])
+speech_texts = (speech for name, speech in iter_speeches('uk.proc.d.2013-12-11.xml'))
+vocabulary = build_vocabulary(map(lowercase, speech_texts), min_count=5)
+print(len(vocabulary), 'words')
+
+vectorizer = StreamingVectorizer(vocabulary, preprocess=lowercase)
+speech_texts = (speech for name, speech in iter_speeches('uk.proc.d.2013-12-11.xml'))
+paths = vectorizer.write_chunks(speech_texts, 'speech_matrix', chunk_size=100)
+print(paths)
+dtm = merge_chunks(paths)
+print(dtm.shape, dtm.nnz)
+print(dtm[:, vocabulary['government']].sum(), "occurrences of 'government'")
+
+
+# With feature hashing, there is no vocabulary to build first.  For the tweets of the sample, with tweet_texts, which yields the unescaped text of each tweet of a file:
+
+# In[ ]:
+
+
+hashing_vectorizer = StreamingVectorizer(n_features=2**18, preprocess=lowercase)
+tweet_matrix = hashing_vectorizer.transform(tweet_texts('tweets-sample.txt'))
+tweet_matrix
+
+
+# <h4> Incremental extraction </h4>
+# 
+# When a corpus is updated every night, only a few files are new or modified.  Rather than starting over, we can keep a <b>manifest</b>: a small JSON file that records, for each input file already processed, its size, its modification time and a hash of its content (a fingerprint computed with the hashlib module).  On the next run, files whose size and modification time have not changed are skipped right away.  If only the modification time changed, the hash tells us whether the content really changed.
+# 
+# The manifest is saved after each file, so that a run that crashes can resume where it stopped.  The code is in pol2578/incremental.py.
+# 
+# Each input file gets its own Parquet file in the output directory.  A modified input simply replaces its part, and pandas reads the whole directory as a single data frame.  Names starting with an underscore or a dot are ignored by the reader, which is why the manifest is called _manifest.json.
+
+# In[ ]:
+
+
+from pol2578.incremental import extract_incremental, speech_rows, tweet_rows
+
+
+# The extractor is any function that takes a path and returns rows.  The module has one for the parliamentary debates, speech_rows, which returns the rows of the SpeechTable of a file, and one for tweets, tweet_rows, which yields the user and unescaped text of each tweet.  For the debates:
+
+# In[ ]:
+
+
+sittings = sorted(glob.glob('uk.proc.d.*.xml'))
+print(extract_incremental(sittings, speech_rows, 'speeches_parquet', SpeechTable.columns))
+# The second run skips the file, which has not changed.
+print(extract_incremental(sittings, speech_rows, 'speeches_parquet', SpeechTable.columns))
+
+pd.read_parquet('speeches_parquet').shape
+
+
+# From a terminal, the command pol2578 incremental does the same, for instance pol2578 incremental speeches uk.proc.d.*.xml -o speeches_parquet.  And for tweets:
+
+# In[ ]:
+
+
+print(extract_incremental(['tweets-sample.txt'], tweet_rows, 'tweets_parquet', ('user', 'tweet')))
+pd.read_parquet('tweets_parquet')
+
+
+# <h4> Caching the extractions </h4>
+# 
+# During an analysis, we often run the same extraction again on the same files: after restarting the notebook, or in another notebook.  The ExtractionCache class of pol2578/cache.py saves the result of an extraction function on disk, with the pickle module, under a key made of a hash of the content of the file, the name of the function, a hash of its code, its arguments and a version number.  Editing the function therefore makes new entries; when a function that it calls changes, we pass a new version to the cache.  The next call with a file of the same content, even under another name, loads the result instead of parsing the file again.  When the file changes, its hash changes too, and the extraction runs again.
+# 
+# The cache has a maximum size: when it is reached, the entries that were not used for the longest time are deleted (a <b>least recently used</b>, or LRU, policy).
+
+# In[ ]:
+
+
+from pol2578.cache import ExtractionCache
+from pol2578.articles import extract_article
+
+cache = ExtractionCache('extraction_cache', max_size=100 * 1024**2)
+
+for attempt in ('first run', 'second run'):
+    start = time.perf_counter()
+    table = cache(read_speeches, 'uk.proc.d.2013-12-11.xml')
+    article = cache(extract_article, 'about_library.html', 'article', {'about': '/about'})
+    tweets = cache(tweet_rows, 'tweets-sample.txt')
+    print(f"{attempt}: {time.perf_counter() - start:0.4f} seconds.")
+
+print(len(table), len(article), len(tweets))
+print(cache.hits, 'hits,', cache.misses, 'misses,', cache.size, 'bytes')
+
+
+# <h3> Benchmarking the pipelines </h3>
+# 
+# To know whether a change makes the code faster or slower, we need measurements that can be repeated and compared.  The functions of pol2578/bench.py build a larger synthetic corpus from the sample files, run each pipeline on it and record:
+# <ul>
+# <li> the <b>throughput</b>, in items and megabytes per second; </li>
+# <li> the <b>latency</b> of each unit of work (a file, a page, a tweet, a batch of documents), summarized by its percentiles; </li>
+# <li> the <b>peak memory</b> (resident set size, or RSS) of the process. </li>
+# </ul>
+# 
+# The synthetic corpus repeats the samples: the debates of the sitting are copied ten times within each xml file, and the number of xml files, the repetitions of the tweets and documents, and the copies of the web page all grow in proportion to the scale, so that the size of the corpus does too.
+# 
+# Each benchmark returns the number of items processed, the number of bytes read and the list of latencies.
+# 
+# To measure the peak memory of each pipeline separately, every benchmark runs in a new worker process.  On Linux, the peak is read from /proc/self/status after resetting it; elsewhere, we use the resource module, whose value also includes the memory inherited from the notebook.
+# 
+# The results are saved in a JSON file, with information about the machine and the version of the code (the git commit, when the code is in a git repository).
+
+# In[ ]:
+
+
+from pol2578.bench import run_benchmarks, compare_benchmarks
+
+
+# In[ ]:
+
+
+results = run_benchmarks(scale=2)
+pd.DataFrame(results['results']).T[['items', 'items_per_second', 'mb_per_second', 'peak_rss_mb']]
+
+
+# Running the benchmarks again, for instance after changing a function, and comparing the two files lists the pipelines that got slower or use more memory.  Timings vary a bit from one run to the next, hence the tolerance.  Only runs made with the same scale, Python version and platform can be compared: otherwise compare_benchmarks raises an error.  From a terminal, the same is done with the command pol2578 bench -o benchmarks-new.json --compare benchmarks.json.
+
+# In[ ]:
+
+
+run_benchmarks('benchmarks-new.json', scale=2)
+compare_benchmarks('benchmarks.json', 'benchmarks-new.json')
+
+
+# <h3> Profiling the pipelines </h3>
+# 
+# The benchmarks tell us how fast each pipeline is; the profiler we imported earlier tells us where the time goes within a pipeline.  We turn it on, run the pipelines, and turn it off.  Note that the profiler only sees the stages that run in the notebook process, not those running in a process pool.
+
+# In[ ]:
+
+
+from pol2578.articles import soup_article_lines
+from pol2578.tweets import parse_chunk
+
+profiler.reset()
+profiler.enabled = True
+
+read_speeches('uk.proc.d.2013-12-11.xml')
+for i in range(10):
+    extract_article('about_library.html', 'article', {"about" : "/about"})
+    soup_article_lines('about_library.html', 'article', {"about" : "/about"})
+for batch in iter_tweet_batches('tweets-large.txt', loads=fast_loads):
+    pass
+parse_chunk('tweets-large.txt', 0, os.path.getsize('tweets-large.txt'))
+
+profiler.enabled = False
+profiler.summary()
+
+
+# The profile can also be saved in the "folded" format, and turned into a flame graph, for instance by dropping the file on https://www.speedscope.app.
+
+# In[ ]:
+
+
+profiler.write_folded('profile.folded')
+
+with open('profile.folded') as f:
+    print(f.read())
+
+
+# Finally, let's check that the instrumentation costs almost nothing when the profiler is off, by timing the tweet parser with and without the stages.
+
+# In[ ]:
+
+
+lines = [line for line in tweet_stream if line] * 200
+
+start = time.perf_counter()
+for line in lines:
+    tweet_parser(line, loads=fast_loads)
+print(f"without stages: {time.perf_counter() - start:0.4f} seconds.")
+
+start = time.perf_counter()
+for line in lines:
+    with profiler.stage('tweet_parser', len(line)):
+        tweet_parser(line, loads=fast_loads)
+print(f"with the profiler off: {time.perf_counter() - start:0.4f} seconds.")
+
+
 # This concludes our tour of the Python programming language.  We will have opportunities to work with all sorts of scripts later on, and to learn libraries specific to NLP. 
 # 
 # An advantage of Python is its simplicity and the very large community of users.  For most questions that you may have, the answer is already there on StackOverflow.  
@@ -0,0 +1,72 @@
+"""Text extraction pipelines of the POL2578 course.
+
+The names below are loaded on first use, so that ``import pol2578`` does not
+import lxml, pandas, numpy, pyarrow, scipy or bs4.
+"""
+
+import importlib
+
+__version__ = '0.1.0'
+
+_LAZY = {
+    'tweet_parser': 'tweets',
+    'get_json_loads': 'tweets',
+    'open_compressed': 'tweets',
+    'iter_tweet_batches': 'tweets',
+    'parse_tweets_parallel': 'tweets',
+    'RetweetStore': 'tweets',
+    'TweetProjection': 'projection',
+    'TWEET_FIELDS': 'projection',
+    'parse_tweets_deduplicated': 'tweets',
+    'remove_words': 'text',
+    'WordFilter': 'text',
+    'TextPipeline': 'text',
+    'score_corpus': 'text',
+    'SENTIMENT': 'text',
+    'iter_speeches': 'speeches',
+    'SpeechTable': 'speeches',
+    'read_speeches': 'speeches',
+    'build_corpus': 'speeches',
+    'iter_element_lines': 'articles',
+    'extract_article': 'articles',
+    'extract_articles': 'articles',
+    'PageTimeout': 'articles',
+    'detect_encoding': 'transcoding',
+    'transcode': 'transcoding',
+    'transcode_directory': 'transcoding',
+    'write_batches': 'columnar',
+    'write_rows': 'columnar',
+    'MappedFile': 'mapped',
+    'MappedTweets': 'mapped',
+    'MappedSpeeches': 'mapped',
+    'TweetIndex': 'archive',
+    'consume': 'stream',
+    'consume_stream': 'stream',
+    'start_replay_server': 'stream',
+    'SpeechIndex': 'search',
+    'index_speeches': 'search',
+    'StreamingVectorizer': 'vectorize',
+    'build_vocabulary': 'vectorize',
+    'merge_chunks': 'vectorize',
+    'vectorize_files': 'vectorize',
+    'ExtractionCache': 'cache',
+    'Manifest': 'incremental',
+    'extract_incremental': 'incremental',
+    'profiler': 'profiling',
+    'StageProfiler': 'profiling',
+}
+
+__all__ = sorted(_LAZY)
+
+
+def __getattr__(name):
+    module = _LAZY.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module('.' + module, __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY))
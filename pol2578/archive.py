@@ -0,0 +1,181 @@
+"""A persistent index of the tweets of a JSONL archive.
+
+The index is an sqlite database, saved next to the archive, with the byte
+offset and length of each tweet, its id, the screen name of its author and
+its creation time.  It is built once, and ``update()`` only reads the lines
+appended since the last update.  Lookups then read a single line from the
+archive instead of parsing the whole file.
+"""
+
+import hashlib
+import os
+import sqlite3
+from datetime import datetime, timezone
+
+from .tweets import detect_compression, get_json_loads
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tweets (
+    offset INTEGER PRIMARY KEY,
+    length INTEGER NOT NULL,
+    id INTEGER,
+    screen_name TEXT,
+    created_at INTEGER
+);
+CREATE INDEX IF NOT EXISTS tweets_id ON tweets (id);
+CREATE INDEX IF NOT EXISTS tweets_screen_name ON tweets (screen_name COLLATE NOCASE);
+CREATE INDEX IF NOT EXISTS tweets_created_at ON tweets (created_at);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value);
+"""
+
+# The first bytes of the archive are hashed, to notice a file that was replaced rather than appended to.
+HEAD_SIZE = 4096
+
+
+def tweet_time(tweet):
+    """Return the creation time of a tweet in seconds since 1970 (UTC)."""
+    if 'timestamp_ms' in tweet:
+        return int(tweet['timestamp_ms']) // 1000
+    created_at = datetime.strptime(tweet['created_at'], '%a %b %d %H:%M:%S %z %Y')
+    return int(created_at.timestamp())
+
+
+def to_timestamp(value):
+    # Accepts seconds since 1970, datetimes and ISO 8601 strings; naive times are in UTC.
+    if value is None or isinstance(value, (int, float)):
+        return value
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return int(value.timestamp())
+
+
+def index_entry(tweet_object, loads):
+    # The decoded tweet must not outlive the call: simdjson reuses its buffer.
+    tweet = loads(tweet_object)
+    return tweet['id'], tweet['user']['screen_name'], tweet_time(tweet)
+
+
+class TweetIndex:
+    """Offsets of the tweets of an uncompressed JSONL file, by id, author and time.
+
+    The lookup methods return the lines of the archive as bytes, ready for
+    tweet_parser or json.loads.
+    """
+
+    def __init__(self, path, index_path=None, batch_size=10000):
+        if detect_compression(path) is not None:
+            raise ValueError(f"{path} is compressed: byte offsets need an uncompressed file.")
+        self.path = path
+        self.index_path = index_path or path + '.index.sqlite'
+        self.batch_size = batch_size
+        self.db = sqlite3.connect(self.index_path)
+        self.db.executescript(SCHEMA)
+        self.file = open(path, 'rb')
+
+    def _meta(self, key, default=None):
+        row = self.db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return default if row is None else row[0]
+
+    def _head_digest(self, size):
+        self.file.seek(0)
+        return hashlib.sha256(self.file.read(min(size, HEAD_SIZE))).hexdigest()
+
+    def update(self, loads=None):
+        """Index the lines added since the last update, and return their number of tweets.
+
+        The index is rebuilt if the archive is shorter than before, or if its
+        first bytes changed.  A last line without a newline is left for the
+        next update, since it may still be being written.
+        """
+        loads = loads or get_json_loads()
+        # The file is opened again: the buffer of the previous file object can
+        # hold bytes that were changed since, and the archive may have been
+        # replaced by a new file.
+        self.file.close()
+        self.file = open(self.path, 'rb')
+        indexed = self._meta('size', 0)
+        size = os.fstat(self.file.fileno()).st_size
+        with self.db:
+            if indexed and (size < indexed or self._head_digest(indexed) != self._meta('head')):
+                self.db.execute("DELETE FROM tweets")
+                indexed = 0
+            self.file.seek(indexed)
+            offset = indexed
+            rows = []
+            ntweets = 0
+            for line in self.file:
+                if not line.endswith(b'\n'):
+                    break
+                if line.strip():
+                    try:
+                        rows.append((offset, len(line.rstrip(b'\r\n'))) + index_entry(line, loads))
+                    except (ValueError, KeyError, TypeError):
+                        # Delete notices, limit messages and malformed lines are not indexed.
+                        pass
+                    if len(rows) == self.batch_size:
+                        self.db.executemany("INSERT OR REPLACE INTO tweets VALUES (?, ?, ?, ?, ?)", rows)
+                        ntweets += len(rows)
+                        rows = []
+                offset += len(line)
+            self.db.executemany("INSERT OR REPLACE INTO tweets VALUES (?, ?, ?, ?, ?)", rows)
+            ntweets += len(rows)
+            self.db.execute("INSERT OR REPLACE INTO meta VALUES ('size', ?)", (offset,))
+            self.db.execute("INSERT OR REPLACE INTO meta VALUES ('head', ?)", (self._head_digest(offset),))
+        return ntweets
+
+    def __len__(self):
+        return self.db.execute("SELECT count(*) FROM tweets").fetchone()[0]
+
+    def read(self, offset, length):
+        self.file.seek(offset)
+        return self.file.read(length)
+
+    def offsets(self, tweet_id=None, screen_name=None, start=None, end=None):
+        """Return the (offset, length) of the matching tweets, in file order.
+
+        ``start`` and ``end`` bound the creation time, end excluded.
+        """
+        conditions = []
+        parameters = []
+        if tweet_id is not None:
+            conditions.append("id = ?")
+            parameters.append(int(tweet_id))
+        if screen_name is not None:
+            conditions.append("screen_name = ? COLLATE NOCASE")
+            parameters.append(screen_name)
+        if start is not None:
+            conditions.append("created_at >= ?")
+            parameters.append(to_timestamp(start))
+        if end is not None:
+            conditions.append("created_at < ?")
+            parameters.append(to_timestamp(end))
+        query = "SELECT offset, length FROM tweets"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        return self.db.execute(query + " ORDER BY offset", parameters).fetchall()
+
+    def get(self, tweet_id):
+        """Return the line of a tweet, or None."""
+        found = self.offsets(tweet_id=tweet_id)
+        return self.read(*found[0]) if found else None
+
+    def by_user(self, screen_name):
+        for offset, length in self.offsets(screen_name=screen_name):
+            yield self.read(offset, length)
+
+    def between(self, start=None, end=None):
+        for offset, length in self.offsets(start=start, end=end):
+            yield self.read(offset, length)
+
+    def close(self):
+        self.db.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
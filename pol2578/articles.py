@@ -0,0 +1,102 @@
+"""Extraction of the text of an element from html pages, one page or many at a time."""
+
+import glob
+import os
+import signal
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+from .profiling import profiler
+
+
+def iter_element_lines(path, tag='article', attrs=None, encoding='utf-8'):
+    """Yield the non-empty lines of text of each element matching ``tag`` and ``attrs``.
+
+    Like BeautifulSoup's getText, the content of script and style tags and of
+    comments is left out.  Parsing stops when the caller stops iterating.
+    Pages are read as ``encoding``, utf-8 by default like soup_article_lines;
+    with None, lxml uses the meta charset of the page, and latin-1 when
+    there is none.
+    """
+    from lxml import etree
+    attrs = attrs or {}
+    for event, elem in etree.iterparse(path, events=('end',), tag=tag, html=True, encoding=encoding):
+        if all(elem.get(name) == value for name, value in attrs.items()):
+            with profiler.stage('html.text'):
+                etree.strip_elements(elem, 'script', 'style', with_tail=False)
+                text = ''.join(elem.itertext())
+                lines = [line for line in text.split('\n') if line.strip() != '']
+            yield lines
+
+
+def extract_article(path, tag='article', attrs=None, encoding='utf-8'):
+    """Return the lines of the first matching element, or an empty list."""
+    with profiler.stage('extract_article', os.path.getsize(path)):
+        return next(iter_element_lines(path, tag, attrs, encoding), [])
+
+
+def soup_article_lines(path, tag='article', attrs=None):
+    """Same as extract_article, with BeautifulSoup."""
+    from bs4 import BeautifulSoup
+    with open(path, 'r', encoding='utf-8') as f, profiler.stage('BeautifulSoup', os.path.getsize(path)):
+        soup = BeautifulSoup(f, 'lxml')
+    with profiler.stage('soup.find'):
+        element = soup.find(tag, attrs or {})
+    if element is None:
+        return []
+    with profiler.stage('getText'):
+        return [line for line in element.getText().split('\n') if line.strip()!='']
+
+
+class PageTimeout(Exception):
+    pass
+
+
+def raise_page_timeout(signum, frame):
+    raise PageTimeout("time limit exceeded")
+
+
+def init_page_worker(max_memory):
+    if max_memory is not None:
+        import resource
+        resource.setrlimit(resource.RLIMIT_AS, (max_memory, max_memory))
+    signal.signal(signal.SIGALRM, raise_page_timeout)
+
+
+def extract_page(path, kernel, tag, attrs, timeout):
+    start = time.perf_counter()
+    signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        lines = kernel(path, tag, attrs)
+        error = None
+    except Exception as e:
+        lines = None
+        error = f"{type(e).__name__}: {e}"
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+    return path, lines, time.perf_counter() - start, error
+
+
+def extract_articles(paths, tag='article', attrs=None, kernel=soup_article_lines,
+                     timeout=10, max_memory=None, workers=None, chunksize=4):
+    """Extract the article of many pages in a process pool (Linux and Mac OS only).
+
+    ``paths`` is a directory or a list of files.  Each page gets ``timeout``
+    seconds, and each worker at most ``max_memory`` bytes.  Returns the
+    ``(path, lines, seconds)`` records and the ``(path, seconds, error)`` errors.
+    """
+    if isinstance(paths, str):
+        paths = sorted(glob.glob(os.path.join(paths, '*.html')))
+    records = []
+    errors = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_page_worker,
+                             initargs=(max_memory,)) as executor:
+        pages = executor.map(extract_page, paths, repeat(kernel), repeat(tag), repeat(attrs),
+                             repeat(timeout), chunksize=chunksize)
+        for path, lines, elapsed, error in pages:
+            if error is None:
+                records.append((path, lines, elapsed))
+            else:
+                errors.append((path, elapsed, error))
+    return records, errors
@@ -0,0 +1,236 @@
+"""Reproducible benchmarks of the extraction pipelines.
+
+The synthetic corpus is built from the sample files of the course
+(``samples`` is the directory that contains them).  Each benchmark runs in a
+new worker process, so that its peak memory is measured separately.
+"""
+
+import csv
+import html
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import time
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+from .articles import extract_article
+from .speeches import read_speeches
+from .text import SENTIMENT, remove_words, score_corpus
+from .tweets import get_json_loads, tweet_parser
+
+
+XML_COPIES = 10
+
+# Results are only comparable when these entries of 'meta' are the same.
+COMPARABLE = ('scale', 'xml_copies', 'python', 'platform')
+
+
+def make_synthetic_corpus(directory, scale=10, samples='.'):
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(samples, 'uk.proc.d.2013-12-11.xml'), encoding='utf-8') as f:
+        xml = f.read()
+    start = xml.index('>', xml.index('<proceedings')) + 1
+    end = xml.index('</proceedings>')
+    xml_files = []
+    # ``scale`` files of XML_COPIES copies of the debates, so that the size of
+    # the corpus, like that of the others, grows linearly with ``scale``.
+    for i in range(scale):
+        path = os.path.join(directory, f"uk.proc.d.synthetic-{i:04d}.xml")
+        with open(path, 'w', encoding='utf-8') as fout:
+            fout.write(xml[:end] + xml[start:end] * (XML_COPIES - 1) + xml[end:])
+        xml_files.append(path)
+    html_files = []
+    for i in range(scale * 10):
+        path = os.path.join(directory, f"page-{i:04d}.html")
+        shutil.copyfile(os.path.join(samples, 'about_library.html'), path)
+        html_files.append(path)
+    with open(os.path.join(samples, 'tweets-sample.txt'), 'rb') as f:
+        tweets = [line for line in f.read().splitlines() if line]
+    tweet_file = os.path.join(directory, 'tweets.txt')
+    with open(tweet_file, 'wb') as fout:
+        fout.write(b'\n'.join(tweets * scale * 200) + b'\n')
+    with open(os.path.join(samples, 'example.txt'), encoding='utf-8') as f:
+        documents = f.read().splitlines() * scale * 1000
+    return {'xml': xml_files, 'html': html_files, 'tweets': tweet_file, 'documents': documents}
+
+
+# Each benchmark returns the number of items processed, the number of bytes read and the list of latencies.
+
+def bench_xml_speeches(corpus):
+    nitems, latencies = 0, []
+    for path in corpus['xml']:
+        start = time.perf_counter()
+        nitems += len(read_speeches(path))
+        latencies.append(time.perf_counter() - start)
+    return nitems, sum(os.path.getsize(path) for path in corpus['xml']), latencies
+
+
+def bench_html_articles(corpus):
+    latencies = []
+    for path in corpus['html']:
+        start = time.perf_counter()
+        extract_article(path, 'article', {"about" : "/about"})
+        latencies.append(time.perf_counter() - start)
+    return len(latencies), sum(os.path.getsize(path) for path in corpus['html']), latencies
+
+
+def bench_tweets(corpus):
+    latencies = []
+    loads = get_json_loads()
+    with open(corpus['tweets'], 'rb') as f:
+        for line in f:
+            start = time.perf_counter()
+            user, text = tweet_parser(line, loads=loads)
+            html.unescape(text)
+            latencies.append(time.perf_counter() - start)
+    return len(latencies), os.path.getsize(corpus['tweets']), latencies
+
+
+def bench_csv_roundtrip(corpus, repeat=5):
+    import pandas as pd
+
+    documents = corpus['documents']
+    path = os.path.join(os.path.dirname(corpus['tweets']), 'roundtrip.csv')
+    latencies = []
+    for i in range(repeat):
+        start = time.perf_counter()
+        with open(path, 'w', encoding='utf-8', newline='') as fout:
+            w = csv.writer(fout)
+            w.writerow(('docnumber','text'))
+            w.writerows(enumerate(documents))
+        pd.read_csv(path, delimiter=',', header=0)
+        latencies.append(time.perf_counter() - start)
+    return len(documents) * repeat, os.path.getsize(path) * repeat, latencies
+
+
+def bench_sentiment(corpus, batch_size=1000):
+    documents = corpus['documents']
+    latencies = []
+    for i in range(0, len(documents), batch_size):
+        start = time.perf_counter()
+        score_corpus(documents[i:i + batch_size], SENTIMENT)
+        latencies.append(time.perf_counter() - start)
+    return len(documents), sum(len(d.encode('utf-8')) for d in documents), latencies
+
+
+def bench_remove_words(corpus):
+    documents = corpus['documents']
+    latencies = []
+    for document in documents:
+        start = time.perf_counter()
+        remove_words(document)
+        latencies.append(time.perf_counter() - start)
+    return len(documents), sum(len(d.encode('utf-8')) for d in documents), latencies
+
+
+BENCHMARKS = {'xml_speeches': bench_xml_speeches,
+              'html_articles': bench_html_articles,
+              'tweets': bench_tweets,
+              'csv_roundtrip': bench_csv_roundtrip,
+              'sentiment': bench_sentiment,
+              'remove_words': bench_remove_words}
+
+
+def current_rss():
+    """Return the current and peak resident set size of the process, in bytes."""
+    try:
+        with open('/proc/self/status') as f:
+            status = dict(line.split(':', 1) for line in f)
+        return int(status['VmRSS'].split()[0]) * 1024, int(status['VmHWM'].split()[0]) * 1024
+    except OSError:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is in kilobytes on Linux and in bytes on Mac OS.
+        peak = peak if sys.platform == 'darwin' else peak * 1024
+        return peak, peak
+
+
+def run_benchmark(name, corpus):
+    import numpy as np
+
+    try:
+        # Reset the peak RSS of this process (Linux only).
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        pass
+    rss_before, peak = current_rss()
+    start = time.perf_counter()
+    nitems, nbytes, latencies = BENCHMARKS[name](corpus)
+    seconds = time.perf_counter() - start
+    rss_after, peak = current_rss()
+    latencies = np.array(latencies) * 1000
+    percentiles = {f"p{q}": float(np.percentile(latencies, q)) for q in (50, 90, 99)}
+    percentiles['max'] = float(latencies.max())
+    return {'items': nitems,
+            'bytes': nbytes,
+            'seconds': seconds,
+            'items_per_second': nitems / seconds,
+            'mb_per_second': nbytes / seconds / 1e6,
+            'latency_ms': percentiles,
+            'peak_rss_mb': peak / 1e6,
+            'rss_increase_mb': (peak - rss_before) / 1e6}
+
+
+def run_benchmarks(output='benchmarks.json', directory='synthetic_corpus', scale=10, names=None, samples='.'):
+    """Run the benchmarks and save the results, with the machine and git commit, as JSON."""
+    corpus = make_synthetic_corpus(directory, scale, samples)
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = ''
+    results = {'meta': {'date': datetime.now().isoformat(timespec='seconds'),
+                        'commit': commit,
+                        'python': platform.python_version(),
+                        'platform': platform.platform(),
+                        'cpus': os.cpu_count(),
+                        'scale': scale,
+                        'xml_copies': XML_COPIES},
+               'results': {}}
+    for name in names or BENCHMARKS:
+        with ProcessPoolExecutor(max_workers=1) as executor:
+            results['results'][name] = executor.submit(run_benchmark, name, corpus).result()
+    with open(output, 'w', encoding='utf-8') as fout:
+        json.dump(results, fout, indent=1)
+    return results
+
+
+def load_results(results):
+    if isinstance(results, dict):
+        return results
+    with open(results, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def compare_benchmarks(old, new, tolerance=0.10, strict=True):
+    """List the (benchmark, metric, old, new) values that got worse by more than ``tolerance``.
+
+    ``old`` and ``new`` are JSON files written by run_benchmarks, or their
+    loaded contents.  The two runs must have the same corpus, Python version
+    and platform: otherwise a ValueError is raised, or, with
+    ``strict=False``, a warning.
+    """
+    old, new = load_results(old), load_results(new)
+    differences = [f"{key} {old['meta'].get(key)!r} != {new['meta'].get(key)!r}"
+                   for key in COMPARABLE if old['meta'].get(key) != new['meta'].get(key)]
+    if differences:
+        message = "The benchmarks were not run in the same conditions: " + ", ".join(differences)
+        if strict:
+            raise ValueError(message)
+        warnings.warn(message)
+    old, new = old['results'], new['results']
+    regressions = []
+    for name in sorted(old.keys() & new.keys()):
+        before, after = old[name], new[name]
+        if after['items_per_second'] < before['items_per_second'] * (1 - tolerance):
+            regressions.append((name, 'items_per_second', before['items_per_second'], after['items_per_second']))
+        if after['latency_ms']['p99'] > before['latency_ms']['p99'] * (1 + tolerance):
+            regressions.append((name, 'latency_ms.p99', before['latency_ms']['p99'], after['latency_ms']['p99']))
+        if after['rss_increase_mb'] > before['rss_increase_mb'] * (1 + tolerance) + 1:
+            regressions.append((name, 'rss_increase_mb', before['rss_increase_mb'], after['rss_increase_mb']))
+    return regressions
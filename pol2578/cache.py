@@ -0,0 +1,181 @@
+"""A content-addressed cache of extraction results.
+
+The result of ``extractor(path, *args)`` is stored on disk under a key made
+of the sha256 of the content of the file, the name, version and code of
+the extractor, and its other arguments.  A renamed or copied file is still
+found in the cache, and a modified file, or a new version of the
+extractor, gets a new entry.  Results are pickled with the highest
+protocol, which stores strings and lists in a compact binary form that is
+loaded much faster than the input is parsed again.
+
+The least recently used entries are deleted when the cache grows beyond
+``max_size`` bytes.  The time of last use of an entry is the modification
+time of its file, which is updated on each hit.
+"""
+
+import hashlib
+import os
+import pickle
+import tempfile
+
+from .incremental import Manifest
+
+
+def stable_repr(constant):
+    # The order of a frozenset, such as the constant of ``word in {'a', 'b'}``,
+    # changes from one process to the next with the hashes of strings.
+    if isinstance(constant, frozenset):
+        return 'frozenset(' + repr(sorted(stable_repr(item) for item in constant)) + ')'
+    if isinstance(constant, tuple):
+        return '(' + ', '.join(stable_repr(item) for item in constant) + ',)'
+    return repr(constant)
+
+
+def code_digest(extractor):
+    """Return a hash of the bytecode and constants of a function, or '' for other callables.
+
+    Editing the body of the extractor changes its key, without a new
+    version.  The functions it calls are not hashed.
+    """
+    code = getattr(extractor, '__code__', None)
+    if code is None:
+        return ''
+    digest = hashlib.sha256()
+    codes = [code]
+    while codes:
+        code = codes.pop()
+        digest.update(code.co_code)
+        for constant in code.co_consts:
+            if hasattr(constant, 'co_code'):
+                # Nested functions, comprehensions and generator expressions.
+                codes.append(constant)
+            else:
+                digest.update(stable_repr(constant).encode('utf-8'))
+        digest.update(repr(code.co_names).encode('utf-8'))
+    return digest.hexdigest()
+
+
+class ExtractionCache:
+    """An on-disk cache of the results of extraction functions, keyed by the content of their input.
+
+    ``cache(read_speeches, path)`` returns ``read_speeches(path)``, from the
+    cache when it is there.  Iterators, such as the generators of
+    iter_speeches, are stored as lists.  The sha256 of each input is
+    remembered with its size and modification time, as in the manifests of
+    extract_incremental, so that unchanged files are not hashed again.
+    """
+
+    def __init__(self, directory='.pol2578_cache', max_size=2*1024**3):
+        self.directory = directory
+        self.max_size = max_size
+        os.makedirs(directory, exist_ok=True)
+        self.digests = Manifest(os.path.join(directory, '_digests.json'))
+        self.hits = 0
+        self.misses = 0
+        self._size = None
+
+    def digest(self, path):
+        current, entry = self.digests.check(path)
+        if not current:
+            self.digests.record(path, entry, None)
+        return entry['sha256']
+
+    def key(self, extractor, path, args=(), version=None):
+        if version is None:
+            from . import __version__ as version
+        name = f"{extractor.__module__}.{extractor.__qualname__}"
+        parts = (self.digest(path), name, str(version), code_digest(extractor), repr(args))
+        return hashlib.sha256('\0'.join(parts).encode('utf-8')).hexdigest()
+
+    def entry_path(self, key):
+        return os.path.join(self.directory, key[:2], key + '.pickle')
+
+    def __call__(self, extractor, path, *args, version=None):
+        """Return ``extractor(path, *args)``, from the cache if possible.
+
+        The key includes a hash of the code of ``extractor``, so that its
+        entries are not used once it is edited.  ``version`` defaults to the
+        version of the package; give the extractor a version of its own to
+        invalidate its entries when a function it calls changes.
+        """
+        entry = self.entry_path(self.key(extractor, path, args, version))
+        try:
+            with open(entry, 'rb') as f:
+                result = pickle.load(f)
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+            pass
+        else:
+            os.utime(entry)
+            self.hits += 1
+            return result
+        self.misses += 1
+        result = extractor(path, *args)
+        if hasattr(result, '__next__'):
+            result = list(result)
+        self.put(entry, result)
+        return result
+
+    def wrap(self, extractor, version=None):
+        """Return a version of ``extractor`` that goes through the cache."""
+        def cached(path, *args):
+            return self(extractor, path, *args, version=version)
+        cached.__name__ = getattr(extractor, '__name__', 'cached')
+        cached.__doc__ = extractor.__doc__
+        return cached
+
+    def put(self, entry, result):
+        os.makedirs(os.path.dirname(entry), exist_ok=True)
+        # Written to a temporary file first, so that a crash or a concurrent
+        # run never leaves a truncated entry.
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(entry), suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump(result, f, protocol=pickle.HIGHEST_PROTOCOL)
+        if self._size is None:
+            self._size = self.size
+        self._size += os.path.getsize(tmp)
+        if os.path.exists(entry):
+            self._size -= os.path.getsize(entry)
+        os.replace(tmp, entry)
+        # The directory is only scanned when the cache may be too large.
+        if self._size > self.max_size:
+            self.evict()
+
+    def entries(self):
+        """Return the (path, size, last use) of each entry, least recently used first."""
+        entries = []
+        for root, dirs, files in os.walk(self.directory):
+            for name in files:
+                if name.endswith('.pickle'):
+                    path = os.path.join(root, name)
+                    try:
+                        stat = os.stat(path)
+                    except FileNotFoundError:
+                        continue
+                    entries.append((path, stat.st_size, stat.st_mtime_ns))
+        return sorted(entries, key=lambda entry: entry[2])
+
+    @property
+    def size(self):
+        return sum(size for path, size, used in self.entries())
+
+    def __len__(self):
+        return len(self.entries())
+
+    def evict(self):
+        """Delete the least recently used entries until the cache fits in ``max_size`` bytes."""
+        entries = self.entries()
+        size = sum(entry[1] for entry in entries)
+        for path, entry_size, used in entries:
+            if size <= self.max_size:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            size -= entry_size
+        self._size = size
+
+    def clear(self):
+        for path, size, used in self.entries():
+            os.remove(path)
+        self._size = 0
@@ -0,0 +1,401 @@
+"""Command line interface: one subcommand per pipeline.
+
+    pol2578 speeches uk.proc.d.2013-12-11.xml -o speeches.parquet
+    pol2578 tweets tweets-sample.txt -o tweets.csv
+    pol2578 tweets tweets-sample.txt -o fields.parquet --fields id,created_at,user,text,hashtags
+    pol2578 index tweets-sample.txt --user jel_1957
+    pol2578 replay tweets-sample.txt --port 9000 --repeat 1000
+    pol2578 stream tcp://127.0.0.1:9000 -o tweets.csv
+    pol2578 speech-index speech_index uk.proc.d.*.xml
+    pol2578 search speech_index '"the government" NOT labour' --party Conservative
+    pol2578 articles about_library.html --attr about=/about
+    pol2578 vectorize uk.proc.d.*.xml -o matrix --lower --merge speeches.npz
+    pol2578 incremental speeches uk.proc.d.*.xml -o speeches_parquet
+    pol2578 sentiment example.txt
+    pol2578 remove-words example.txt --word Canada --word bill
+    pol2578 transcode texts texts_unicode
+    pol2578 bench --scale 2 -o benchmarks-new.json --compare benchmarks.json
+"""
+
+import argparse
+import glob
+import json
+import os
+import sys
+
+
+def expand(paths):
+    # Directories and shell patterns are expanded here, so that they also work on Windows.
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(glob.glob(os.path.join(path, '*'))))
+        else:
+            files.extend(sorted(glob.glob(path)) or [path])
+    return files
+
+
+def read_lines(paths):
+    if not paths:
+        for line in sys.stdin:
+            yield line.rstrip('\n')
+        return
+    for path in paths:
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                yield line.rstrip('\n')
+
+
+def write_lines(lines, output):
+    fout = open(output, 'w', encoding='utf-8') if output else sys.stdout
+    try:
+        for line in lines:
+            fout.write(line + '\n')
+    finally:
+        if output:
+            fout.close()
+
+
+def run_speeches(args):
+    from .columnar import write_rows
+    from .speeches import SpeechTable, build_corpus, read_speeches
+
+    paths = expand(args.paths)
+    if args.cache:
+        from .cache import ExtractionCache
+        # Files are read one at a time, from the cache when their content was already extracted.
+        cache = ExtractionCache(args.cache)
+        table = SpeechTable()
+        for path in paths:
+            table.extend(cache(read_speeches, path))
+    elif len(paths) == 1:
+        table = read_speeches(paths[0])
+    else:
+        table, report = build_corpus(paths, workers=args.workers)
+        for sitting, nspeeches, seconds, error in report:
+            if error is not None:
+                print(f"{sitting}: {error}", file=sys.stderr)
+    nrows = write_rows(table.rows(), args.output, SpeechTable.columns)
+    print(f"{nrows} speeches written to {args.output}.", file=sys.stderr)
+
+
+def per_input(output, path):
+    # tweets.csv becomes tweets-<input name>.csv when there are several inputs.
+    root, extension = os.path.splitext(output)
+    return f"{root}-{os.path.basename(path).split('.')[0]}{extension}"
+
+
+def run_tweets(args):
+    from .columnar import write_rows
+    from .tweets import (detect_compression, get_json_loads, iter_tweet_batches,
+                         parse_tweets_deduplicated, parse_tweets_parallel)
+
+    ntweets = 0
+    paths = expand(args.paths)
+    if args.fields:
+        from .projection import TWEET_FIELDS, TweetProjection
+        if args.output.endswith('.csv'):
+            sys.exit("--fields needs a .parquet or .feather output: lists and timestamps do not fit in CSV.")
+        specs = {name: (name, paths, type_name) for name, paths, type_name in TWEET_FIELDS}
+        names = args.fields.split(',')
+        unknown = [name for name in names if name not in specs]
+        if unknown:
+            sys.exit(f"Unknown fields: {', '.join(unknown)}.  Available: {', '.join(specs)}.")
+        projection = TweetProjection([specs[name] for name in names], required=('id',) if 'id' in names else ())
+    for path in paths:
+        output = per_input(args.output, path) if len(paths) > 1 else args.output
+        if args.fields:
+            ntweets += projection.write(path, output, loads=get_json_loads(args.backend))
+        elif args.texts:
+            texts_output = per_input(args.texts, path) if len(paths) > 1 else args.texts
+            ntweets += parse_tweets_deduplicated(path, output, texts_output, get_json_loads(args.backend))[0]
+        elif detect_compression(path) is None and not args.output.endswith(('.feather', '.arrow')):
+            file_format = 'csv' if args.output.endswith('.csv') else 'parquet'
+            ntweets += parse_tweets_parallel(path, output, workers=args.workers,
+                                             backend=args.backend, file_format=file_format)
+        else:
+            loads = get_json_loads(args.backend)
+            rows = (tweet for batch in iter_tweet_batches(path, loads=loads) for tweet in batch)
+            ntweets += write_rows(rows, output, ('user', 'tweet'))
+    print(f"{ntweets} tweets written.", file=sys.stderr)
+
+
+def run_index(args):
+    from .archive import TweetIndex
+
+    with TweetIndex(args.path) as index:
+        ntweets = index.update()
+        print(f"{ntweets} new tweets indexed, {len(index)} in total.", file=sys.stderr)
+        if args.id is None and args.user is None and args.since is None and args.until is None:
+            return
+        offsets = index.offsets(args.id, args.user, args.since, args.until)
+        write_lines((index.read(offset, length).decode('utf-8') for offset, length in offsets), args.output)
+
+
+def run_stream(args):
+    from .stream import consume_stream
+
+    stats = consume_stream(args.source, args.output, batch_size=args.batch_size,
+                           flush_interval=args.flush_interval, workers=args.workers, backend=args.backend)
+    print(f"{stats['tweets']} tweets written ({stats['skipped']} lines skipped), "
+          f"{stats['tweets_per_second']:0.0f} tweets/s.", file=sys.stderr)
+
+
+def run_replay(args):
+    import asyncio
+    from .stream import replay
+
+    try:
+        asyncio.run(replay(args.path, args.host, args.port, args.unix, args.repeat, args.rate))
+    except KeyboardInterrupt:
+        pass
+
+
+def run_speech_index(args):
+    from .search import index_speeches
+
+    index = index_speeches(expand(args.paths), args.directory, args.segment_size)
+    print(f"{len(index)} speeches, {len(index.vocabulary)} terms in {args.directory}.", file=sys.stderr)
+
+
+def run_search(args):
+    from .search import SpeechIndex
+
+    index = SpeechIndex(args.directory)
+    filters = {column: getattr(args, column) for column in ('speaker', 'party', 'topic')
+               if getattr(args, column) is not None}
+    docs = index.search(args.query, **filters)
+    print(f"{len(docs)} speeches.", file=sys.stderr)
+    metadata = index.metadata(docs[:args.limit] if args.limit else docs)
+    write_lines(('\t'.join(str(value) for value in row) for row in metadata.itertuples()), args.output)
+
+
+def run_articles(args):
+    from .articles import extract_article, extract_articles
+
+    attrs = dict(attr.split('=', 1) for attr in args.attr) or None
+    paths = expand(args.paths)
+    if len(paths) == 1:
+        write_lines(extract_article(paths[0], args.tag, attrs), args.output)
+        return
+    records, errors = extract_articles(paths, args.tag, attrs, kernel=extract_article,
+                                       timeout=args.timeout, workers=args.workers)
+    write_lines((json.dumps({'path': path, 'lines': lines}) for path, lines, seconds in records), args.output)
+    for path, seconds, error in errors:
+        print(f"{path}: {error}", file=sys.stderr)
+
+
+def run_vectorize(args):
+    from .text import TextPipeline
+    from .vectorize import StreamingVectorizer, merge_chunks, vectorize_files
+
+    vocabulary = None
+    if args.vocabulary:
+        with open(args.vocabulary, encoding='utf-8') as f:
+            words = [line.strip() for line in f if line.strip()]
+        vocabulary = {word: column for column, word in enumerate(words)}
+    preprocess = TextPipeline(['unescape', 'lower']) if args.lower else None
+    vectorizer = StreamingVectorizer(vocabulary, args.features, preprocess)
+    chunks = vectorize_files(expand(args.paths), args.output, vectorizer, args.chunk_size, workers=args.workers)
+    print(f"{len(chunks)} chunks written to {args.output}.", file=sys.stderr)
+    if args.merge:
+        from scipy import sparse
+        matrix = merge_chunks(chunks)
+        sparse.save_npz(args.merge, matrix)
+        print(f"{matrix.shape[0]} documents, {matrix.shape[1]} columns in {args.merge}.", file=sys.stderr)
+
+
+def run_incremental(args):
+    from .incremental import extract_incremental, speech_rows, tweet_rows
+    from .speeches import SpeechTable
+
+    if args.kind == 'speeches':
+        extract, names = speech_rows, SpeechTable.columns
+    else:
+        extract, names = tweet_rows, ('user', 'tweet')
+    processed, skipped = extract_incremental(expand(args.paths), extract, args.output, names)
+    print(f"{len(processed)} files processed, {len(skipped)} unchanged, in {args.output}.", file=sys.stderr)
+
+
+def run_sentiment(args):
+    from .text import SENTIMENT, score_corpus
+
+    lexicon = SENTIMENT
+    if args.lexicon:
+        with open(args.lexicon, encoding='utf-8') as f:
+            lexicon = json.load(f)
+    documents = list(read_lines(args.paths))
+    scores = score_corpus(documents, lexicon)
+    write_lines((f"{score:0.4f}" for score in scores), args.output)
+
+
+def run_remove_words(args):
+    from .text import WordFilter
+
+    words = list(args.word)
+    if args.words_file:
+        with open(args.words_file, encoding='utf-8') as f:
+            words.extend(line.strip() for line in f if line.strip())
+    word_filter = WordFilter(words or ['Canada', 'bill', 'government', 'law'])
+    write_lines((word_filter(line) for line in read_lines(args.paths)), args.output)
+
+
+def run_transcode(args):
+    from .transcoding import transcode_directory
+
+    results = transcode_directory(args.source_dir, args.destination_dir, args.pattern, args.workers)
+    for path, encoding in results.items():
+        print(f"{path}\t{encoding}")
+
+
+def run_bench(args):
+    from .bench import compare_benchmarks, load_results, run_benchmarks
+
+    # The baseline is read before the results are written, in case they go to the same file.
+    baseline = load_results(args.compare) if args.compare else None
+    results = run_benchmarks(args.output, args.directory, args.scale, args.names, args.samples)
+    for name, result in results['results'].items():
+        print(f"{name}\t{result['items_per_second']:0.0f} items/s\t{result['mb_per_second']:0.2f} MB/s"
+              f"\tp99 {result['latency_ms']['p99']:0.3f} ms\tpeak {result['peak_rss_mb']:0.0f} MB")
+    if args.compare:
+        try:
+            regressions = compare_benchmarks(baseline, results, args.tolerance, strict=not args.force)
+        except ValueError as e:
+            sys.exit(str(e))
+        for name, metric, before, after in regressions:
+            print(f"regression: {name} {metric} {before:0.3f} -> {after:0.3f}")
+        if regressions:
+            sys.exit(1)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='pol2578', description='Text extraction pipelines of the POL2578 course.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    p = subparsers.add_parser('speeches', help='extract the speeches of PoliticalMashup xml files')
+    p.add_argument('paths', nargs='+', help='xml files, patterns or directories')
+    p.add_argument('-o', '--output', default='speeches.parquet', help='.csv, .feather or .parquet file')
+    p.add_argument('-w', '--workers', type=int)
+    p.add_argument('--cache', metavar='DIRECTORY', help='reuse the speeches extracted from files with the same content')
+    p.set_defaults(run=run_speeches)
+
+    p = subparsers.add_parser('tweets', help='extract the user and text of tweets (JSON lines, possibly compressed)')
+    p.add_argument('paths', nargs='+')
+    p.add_argument('-o', '--output', default='tweets.csv', help='.csv, .feather or .parquet file')
+    p.add_argument('-w', '--workers', type=int)
+    p.add_argument('--backend', choices=['orjson', 'simdjson', 'json'])
+    p.add_argument('--texts', help='write each retweeted text once to this file, and only its id in the output')
+    p.add_argument('--fields', help='comma-separated fields to extract instead of the user and text, '
+                                    'such as id,created_at,user,text,hashtags,mentions,urls')
+    p.set_defaults(run=run_tweets)
+
+    p = subparsers.add_parser('index', help='index a tweet archive by id, author and time, and print the matching tweets')
+    p.add_argument('path', help='uncompressed JSONL file')
+    p.add_argument('-o', '--output', help='default: standard output')
+    p.add_argument('--id', type=int)
+    p.add_argument('--user', help='screen name, case insensitive')
+    p.add_argument('--since', help='ISO 8601 time, UTC unless given')
+    p.add_argument('--until', help='ISO 8601 time, excluded')
+    p.set_defaults(run=run_index)
+
+    p = subparsers.add_parser('stream', help='extract the user and text of tweets from a live feed of JSON lines')
+    p.add_argument('source', help='tcp://host:port, unix:/path/to/socket, or - for standard input')
+    p.add_argument('-o', '--output', default='tweets.csv', help='.csv file, or numbered .feather or .parquet parts')
+    p.add_argument('-w', '--workers', type=int)
+    p.add_argument('--backend', choices=['orjson', 'simdjson', 'json'])
+    p.add_argument('--batch-size', type=int, default=1000, help='lines per batch')
+    p.add_argument('--flush-interval', type=float, default=1.0, help='seconds before a partial batch is written')
+    p.set_defaults(run=run_stream)
+
+    p = subparsers.add_parser('replay', help='serve a tweet file to each client that connects, to test stream')
+    p.add_argument('path')
+    p.add_argument('--host', default='127.0.0.1')
+    p.add_argument('--port', type=int, default=9000)
+    p.add_argument('--unix', help='listen on this Unix socket instead')
+    p.add_argument('--repeat', type=int, default=1, help='times the file is sent')
+    p.add_argument('--rate', type=float, help='lines per second')
+    p.set_defaults(run=run_replay)
+
+    p = subparsers.add_parser('speech-index', help='add the speeches of xml files to an inverted index')
+    p.add_argument('directory', help='directory of the index')
+    p.add_argument('paths', nargs='+', help='xml files, patterns or directories')
+    p.add_argument('--segment-size', type=int, default=50000, help='speeches per segment')
+    p.set_defaults(run=run_speech_index)
+
+    p = subparsers.add_parser('search', help='search the speech index with words, "phrases", AND, OR, NOT')
+    p.add_argument('directory', help='directory of the index')
+    p.add_argument('query')
+    p.add_argument('--speaker')
+    p.add_argument('--party')
+    p.add_argument('--topic')
+    p.add_argument('--limit', type=int, default=20, help='speeches to print, 0 for all')
+    p.add_argument('-o', '--output', help='default: standard output')
+    p.set_defaults(run=run_search)
+
+    p = subparsers.add_parser('articles', help='extract the text of an element from html pages')
+    p.add_argument('paths', nargs='+')
+    p.add_argument('-o', '--output', help='default: standard output')
+    p.add_argument('--tag', default='article')
+    p.add_argument('--attr', action='append', default=[], metavar='NAME=VALUE')
+    p.add_argument('--timeout', type=float, default=10)
+    p.add_argument('-w', '--workers', type=int)
+    p.set_defaults(run=run_articles)
+
+    p = subparsers.add_parser('vectorize', help='count the words of speeches (xml) or tweets into sparse matrices')
+    p.add_argument('paths', nargs='+')
+    p.add_argument('-o', '--output', default='matrix', help='directory of the .npz chunks')
+    p.add_argument('--features', type=int, default=2**20, help='columns of the hashing mode')
+    p.add_argument('--vocabulary', help='file with one word per line: frozen vocabulary instead of hashing')
+    p.add_argument('--lower', action='store_true', help='unescape and lowercase the texts first')
+    p.add_argument('--chunk-size', type=int, default=10000, help='documents per chunk')
+    p.add_argument('--merge', metavar='NPZ', help='also stack the chunks into this file')
+    p.add_argument('-w', '--workers', type=int)
+    p.set_defaults(run=run_vectorize)
+
+    p = subparsers.add_parser('incremental', help='extract speeches or tweets to one Parquet file per new or modified input')
+    p.add_argument('kind', choices=('speeches', 'tweets'))
+    p.add_argument('paths', nargs='+')
+    p.add_argument('-o', '--output', required=True, help='directory of the Parquet files and of _manifest.json')
+    p.set_defaults(run=run_incremental)
+
+    p = subparsers.add_parser('sentiment', help='score each line with a sentiment lexicon')
+    p.add_argument('paths', nargs='*', help='default: standard input')
+    p.add_argument('-o', '--output', help='default: standard output')
+    p.add_argument('--lexicon', help='JSON file mapping words to "positive" or "negative"')
+    p.set_defaults(run=run_sentiment)
+
+    p = subparsers.add_parser('remove-words', help='remove words and expressions from each line')
+    p.add_argument('paths', nargs='*', help='default: standard input')
+    p.add_argument('-o', '--output', help='default: standard output')
+    p.add_argument('--word', action='append', default=[])
+    p.add_argument('--words-file', help='file with one word or expression per line')
+    p.set_defaults(run=run_remove_words)
+
+    p = subparsers.add_parser('transcode', help='convert the text files of a directory to utf-8')
+    p.add_argument('source_dir')
+    p.add_argument('destination_dir')
+    p.add_argument('--pattern', default='*.txt')
+    p.add_argument('-w', '--workers', type=int)
+    p.set_defaults(run=run_transcode)
+
+    p = subparsers.add_parser('bench', help='run the benchmarks on a synthetic corpus')
+    p.add_argument('-o', '--output', default='benchmarks.json')
+    p.add_argument('--directory', default='synthetic_corpus')
+    p.add_argument('--samples', default='.', help='directory with the sample files of the course')
+    p.add_argument('--scale', type=int, default=10)
+    p.add_argument('--names', nargs='+')
+    p.add_argument('--compare', metavar='OLD_JSON', help='exit with status 1 if a benchmark regressed')
+    p.add_argument('--tolerance', type=float, default=0.10)
+    p.add_argument('--force', action='store_true',
+                   help='compare runs with a different scale, Python version or platform, with a warning')
+    p.set_defaults(run=run_bench)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    args.run(args)
+
+
+if __name__ == '__main__':
+    main()
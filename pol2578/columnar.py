@@ -0,0 +1,129 @@
+"""Batched Parquet and Feather (Arrow IPC) output."""
+
+from .profiling import profiler
+
+
+def open_writer(path, schema, compression='zstd', file_format='parquet'):
+    """Return a Parquet or Feather (Arrow IPC file) writer; both have write_batch() and close()."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    if file_format == 'parquet':
+        return pq.ParquetWriter(path, schema, compression=compression)
+    options = pa.ipc.IpcWriteOptions(compression=compression)
+    return pa.ipc.new_file(path, schema, options=options)
+
+
+class RowWriter:
+    """Write row tuples to a CSV, Feather or Parquet file, as they come.
+
+    ``write`` can be called many times; Feather and Parquet rows are
+    collected into record batches of ``batch_size`` rows.  Without
+    ``schema``, the types are inferred from the first batch.  ``file_format``
+    defaults to the extension of ``path``.
+    """
+
+    def __init__(self, path, names, schema=None, batch_size=100000, compression='zstd', file_format=None):
+        self.path = path
+        self.names = names
+        self.schema = schema
+        self.batch_size = batch_size
+        self.compression = compression
+        self.file_format = file_format or file_format_of(path)
+        self.nrows = 0
+        self.writer = None
+        self.columns = [[] for name in names]
+        if self.file_format == 'csv':
+            import csv
+            self.fout = open(path, 'w', encoding='utf-8', newline='')
+            self.csv_writer = csv.writer(self.fout)
+            self.csv_writer.writerow(names)
+
+    def write(self, rows):
+        """Write an iterable of rows, and return their number."""
+        if self.file_format == 'csv':
+            nrows = 0
+            for row in rows:
+                self.csv_writer.writerow(row)
+                nrows += 1
+            self.nrows += nrows
+            return nrows
+        first = self.columns[0]
+        appends = [column.append for column in self.columns]
+        batch_size = self.batch_size
+        nrows = 0
+        for row in rows:
+            for append, value in zip(appends, row):
+                append(value)
+            nrows += 1
+            if len(first) == batch_size:
+                self.flush()
+        self.nrows += nrows
+        return nrows
+
+    def flush(self):
+        import pyarrow as pa
+
+        columns = self.columns
+        if self.schema is None:
+            schema = pa.record_batch(columns, names=self.names).schema
+            # A column that is all None in the first batch is inferred as null,
+            # and its values in the next batches could not be written: such
+            # columns are stored as strings.  Give a schema for other types.
+            for i, field in enumerate(schema):
+                if pa.types.is_null(field.type):
+                    schema = schema.set(i, field.with_type(pa.string()))
+            self.schema = schema
+        batch = pa.record_batch(columns, schema=self.schema)
+        if self.writer is None:
+            self.writer = open_writer(self.path, self.schema, self.compression, self.file_format)
+        with profiler.stage('arrow.write_batch', batch.nbytes):
+            self.writer.write_batch(batch)
+        for column in columns:
+            column.clear()
+
+    def close(self):
+        if self.file_format == 'csv':
+            self.fout.close()
+            return
+        # An empty input still gets a file, with its schema.
+        if self.columns[0] or self.writer is None:
+            self.flush()
+        self.writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        if self.file_format == 'csv':
+            self.fout.close()
+        elif exc[0] is None:
+            self.close()
+        elif self.writer is not None:
+            self.writer.close()
+        return False
+
+
+def file_format_of(path):
+    if path.endswith('.csv'):
+        return 'csv'
+    return 'feather' if path.endswith(('.feather', '.arrow')) else 'parquet'
+
+
+def write_batches(rows, path, names, schema=None, batch_size=100000, compression='zstd', file_format='parquet'):
+    """Write an iterable of row tuples to ``path`` in record batches of ``batch_size`` rows.
+
+    Each batch becomes a row group in Parquet files.  Without ``schema``, the
+    types are inferred from the first batch.  Returns the number of rows written.
+    """
+    with RowWriter(path, names, schema, batch_size, compression, file_format) as writer:
+        return writer.write(rows)
+
+
+def write_rows(rows, path, names, schema=None):
+    """Write rows to CSV, Feather or Parquet, depending on the extension of ``path``.
+
+    ``schema`` (a pyarrow schema) is only used by Feather and Parquet.
+    """
+    with RowWriter(path, names, schema) as writer:
+        return writer.write(rows)
@@ -0,0 +1,94 @@
+"""Incremental extraction, with a manifest of the files already processed."""
+
+import hashlib
+import html
+import json
+import os
+
+from .columnar import write_batches
+
+
+def file_digest(path, block_size=1024*1024):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class Manifest:
+    """Size, modification time and sha256 of each processed file, saved as JSON."""
+
+    def __init__(self, path):
+        self.path = path
+        try:
+            with open(path, encoding='utf-8') as f:
+                self.entries = json.load(f)
+        except FileNotFoundError:
+            self.entries = {}
+
+    def check(self, path):
+        # Returns whether the file is unchanged, and the entry to record once it is processed.
+        stat = os.stat(path)
+        entry = {'size': stat.st_size, 'mtime': stat.st_mtime_ns}
+        previous = self.entries.get(os.path.abspath(path))
+        if previous is None or previous['size'] != entry['size']:
+            entry['sha256'] = file_digest(path)
+            return False, entry
+        if previous['mtime'] == entry['mtime']:
+            return True, previous
+        entry['sha256'] = file_digest(path)
+        if previous['sha256'] == entry['sha256']:
+            previous['mtime'] = entry['mtime']
+            self.save()
+            return True, previous
+        return False, entry
+
+    def record(self, path, entry, output):
+        entry['output'] = output
+        self.entries[os.path.abspath(path)] = entry
+        self.save()
+
+    def save(self):
+        # Write to a temporary file first, so that a crash never leaves a truncated manifest.
+        with open(self.path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(self.entries, f, indent=1)
+        os.replace(self.path + '.tmp', self.path)
+
+
+def extract_incremental(paths, extract, output_dir, names):
+    """Write ``extract(path)`` rows to one Parquet file per new or modified input.
+
+    Returns the lists of processed and skipped paths.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    manifest = Manifest(os.path.join(output_dir, '_manifest.json'))
+    processed = []
+    skipped = []
+    for path in paths:
+        # The fingerprint is taken before extraction, so that a file modified
+        # during the run is processed again next time.
+        current, entry = manifest.check(path)
+        if current:
+            skipped.append(path)
+            continue
+        key = hashlib.sha1(os.path.abspath(path).encode('utf-8')).hexdigest()[:8]
+        part = f"{os.path.basename(path)}-{key}.parquet"
+        tmp = os.path.join(output_dir, '.' + part)
+        write_batches(extract(path), tmp, names)
+        os.replace(tmp, os.path.join(output_dir, part))
+        manifest.record(path, entry, part)
+        processed.append(path)
+    return processed, skipped
+
+
+def speech_rows(path):
+    from .speeches import read_speeches
+    return read_speeches(path).rows()
+
+
+def tweet_rows(path):
+    from .tweets import iter_tweet_batches
+    for batch in iter_tweet_batches(path):
+        for user, text in batch:
+            yield user, html.unescape(text)
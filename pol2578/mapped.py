@@ -0,0 +1,248 @@
+"""Memory-mapped readers for large JSONL and xml files.
+
+The file is mapped in memory with mmap instead of being read into Python
+strings: the operating system loads its pages on demand, and the pages are
+shared between processes that map the same file.  The readers find the
+offsets of the lines (or speeches) once, with numpy or a regular
+expression run directly on the map, and then give the Nth record in
+constant time as a memoryview, which is a slice of the map, not a copy.
+
+orjson and simdjson decode memoryviews directly; ``buffer_loads`` wraps
+json.loads, which only accepts bytes and strings.  As long as a memoryview
+of the file is alive, the map cannot be closed: ``close()`` then leaves it
+to be freed with the last view.
+"""
+
+import mmap
+import re
+
+from .speeches import PM
+
+
+class MappedFile:
+    """A read-only memory map of a file, with the offsets of its non-empty lines.
+
+    ``starts`` and ``ends`` are numpy arrays with the byte offsets of each
+    line, without the newline (and carriage return) that ends it.
+    """
+
+    def __init__(self, path, chunk_size=64*1024*1024):
+        self.path = path
+        self.file = open(path, 'rb')
+        try:
+            self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # Empty files cannot be mapped.
+            self.map = None
+        self.view = memoryview(self.map if self.map is not None else b'')
+        self.chunk_size = chunk_size
+        self._starts = self._ends = None
+
+    @property
+    def size(self):
+        return len(self.view)
+
+    @property
+    def starts(self):
+        if self._starts is None:
+            self._starts, self._ends = find_lines(self.view, self.chunk_size)
+        return self._starts
+
+    @property
+    def ends(self):
+        self.starts
+        return self._ends
+
+    def __len__(self):
+        return len(self.starts)
+
+    def line(self, i):
+        """Return line ``i`` as a memoryview.  str(view, 'utf-8') decodes it."""
+        return self.view[self.starts[i]:self.ends[i]]
+
+    __getitem__ = line
+
+    def __iter__(self):
+        view = self.view
+        for start, end in zip(self.starts.tolist(), self.ends.tolist()):
+            yield view[start:end]
+
+    def close(self):
+        self.view.release()
+        if self.map is not None:
+            try:
+                self.map.close()
+            except BufferError:
+                # Views of the lines are still alive: the map is freed with the last one.
+                pass
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+
+def find_lines(buffer, chunk_size=64*1024*1024):
+    """Return the start and end offsets of the non-empty lines of a bytes-like object.
+
+    The newlines are searched with numpy, ``chunk_size`` bytes at a time, so
+    that the temporary arrays stay small.
+    """
+    import numpy as np
+
+    data = np.frombuffer(buffer, dtype=np.uint8)
+    size = len(data)
+    newlines = [np.flatnonzero(data[i:i + chunk_size] == 10) + i for i in range(0, size, chunk_size)]
+    ends = np.concatenate(newlines + [np.array([], dtype=np.int64)]).astype(np.int64)
+    if size and data[size - 1] != 10:
+        ends = np.append(ends, size)
+    starts = np.empty_like(ends)
+    if len(ends):
+        starts[0] = 0
+        starts[1:] = ends[:-1] + 1
+        # Windows line endings.
+        carriage_returns = (ends > starts) & (data[np.maximum(ends - 1, 0)] == 13)
+        ends = ends - carriage_returns
+    keep = ends > starts
+    del data
+    return starts[keep], ends[keep]
+
+
+def buffer_loads(loads):
+    """Return a version of ``loads`` that accepts memoryviews."""
+    try:
+        loads(memoryview(b'{}'))
+        return loads
+    except TypeError:
+        return lambda view: loads(bytes(view))
+
+
+class MappedTweets:
+    """Random access to the tweets of an uncompressed JSONL file.
+
+    ``tweets[i]`` parses the Nth tweet only, with tweet_parser.
+    """
+
+    def __init__(self, path, loads=None):
+        from .tweets import get_json_loads
+        self.file = MappedFile(path)
+        self.loads = buffer_loads(loads or get_json_loads())
+
+    def __len__(self):
+        return len(self.file)
+
+    def __getitem__(self, i):
+        from .tweets import tweet_parser
+        return tweet_parser(self.file.line(i), loads=self.loads)
+
+    def __iter__(self):
+        from .tweets import tweet_parser
+        loads = self.loads
+        for line in self.file:
+            yield tweet_parser(line, loads=loads)
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+
+XMLNS = re.compile(rb'xmlns(?::([\w.-]+))?\s*=\s*"([^"]*)"')
+
+
+class MappedSpeeches:
+    """Random access to the speeches of a PoliticalMashup xml file.
+
+    The speech tags are found with a regular expression run on the map, and
+    ``speeches[i]`` parses the Nth speech only, returning the same
+    ``(speaker, speech)`` pair as iter_speeches.  This assumes that speeches
+    are not nested and do not appear in comments or CDATA sections, which
+    holds for the proceedings files.
+    """
+
+    def __init__(self, path, namespace=PM):
+        self.file = MappedFile(path)
+        self.namespace = namespace
+        self._starts = self._ends = None
+
+    def _find_speeches(self):
+        import numpy as np
+
+        view = self.file.view
+        buffer = self.file.map if self.file.map is not None else b''
+        namespace = self.namespace.encode('utf-8')
+        # The namespace declarations of the enclosing elements.  We assume
+        # they are all made before the first speech.
+        declarations = {}
+        names = [b'speech']
+        for match in XMLNS.finditer(buffer[:1024*1024]):
+            prefix, uri = match.groups()
+            if prefix is not None:
+                declarations[prefix] = uri
+                if uri == namespace:
+                    names.append(prefix + b':speech')
+        wrapper = b''.join(b' xmlns:%s="%s"' % item for item in declarations.items())
+        self.wrapper = (b'<speeches xmlns="%s"%s>' % (namespace, wrapper), b'</speeches>')
+        tags = re.compile(rb'<(/?)(?:%s)[\s/>]' % b'|'.join(re.escape(name) for name in names))
+        starts, ends = [], []
+        for match in tags.finditer(buffer):
+            end = buffer.find(b'>', match.end() - 1) + 1
+            if match.group(1):
+                ends.append(end)
+            else:
+                starts.append(match.start())
+                if view[end - 2:end - 1] == b'/':
+                    ends.append(end)
+        self._starts = np.array(starts, dtype=np.int64)
+        self._ends = np.array(ends, dtype=np.int64)
+
+    @property
+    def starts(self):
+        if self._starts is None:
+            self._find_speeches()
+        return self._starts
+
+    @property
+    def ends(self):
+        self.starts
+        return self._ends
+
+    def __len__(self):
+        return len(self.starts)
+
+    def element(self, i):
+        """Parse speech ``i`` and return its lxml element."""
+        from lxml import etree
+        head, tail = self.wrapper
+        # lxml needs the namespace declarations of the document: the speech is
+        # copied once, between the declarations and the closing tag.
+        document = b''.join((head, self.file.view[self.starts[i]:self.ends[i]], tail))
+        return etree.fromstring(document, etree.XMLParser(huge_tree=True))[0]
+
+    def __getitem__(self, i):
+        from lxml import etree
+        elem = self.element(i)
+        speech = etree.tostring(elem, method="text", encoding="unicode", with_tail=False)
+        return elem.get('{%s}speaker' % self.namespace), speech
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
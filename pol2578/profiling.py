@@ -0,0 +1,91 @@
+"""Per-stage counters and timers for the extraction pipelines.
+
+Pipelines mark their steps with ``profiler.stage(name, nbytes)``.  When the
+profiler is off, ``stage()`` returns a shared context manager that does
+nothing and ``instrument()`` returns the function unchanged.
+"""
+
+import time
+from contextlib import nullcontext
+
+
+class Stage:
+
+    def __init__(self, profiler, name, nbytes):
+        self.profiler = profiler
+        self.name = name
+        self.nbytes = nbytes
+
+    def __enter__(self):
+        self.children = 0.0
+        self.profiler.stack.append(self)
+        self.cpu = time.thread_time()
+        self.wall = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        wall = time.perf_counter() - self.wall
+        cpu = time.thread_time() - self.cpu
+        stack = self.profiler.stack
+        key = tuple(stage.name for stage in stack)
+        stack.pop()
+        if stack:
+            stack[-1].children += wall
+        stats = self.profiler.stats.setdefault(key, [0, 0, 0.0, 0.0, 0.0])
+        stats[0] += 1
+        stats[1] += self.nbytes
+        stats[2] += wall
+        stats[3] += cpu
+        stats[4] += wall - self.children
+        return False
+
+
+class StageProfiler:
+
+    def __init__(self):
+        self.enabled = False
+        self.null = nullcontext()
+        self.reset()
+
+    def reset(self):
+        self.stats = {}
+        self.stack = []
+
+    def stage(self, name, nbytes=0):
+        if not self.enabled:
+            return self.null
+        return Stage(self, name, nbytes)
+
+    def instrument(self, func, name, size=len):
+        if not self.enabled:
+            return func
+        def instrumented(arg, *args, **kwargs):
+            with Stage(self, name, size(arg) if size else 0):
+                return func(arg, *args, **kwargs)
+        return instrumented
+
+    def summary(self):
+        """Return a data frame with one row per stage name, slowest first."""
+        import pandas as pd
+        rows = {}
+        for key, (calls, nbytes, wall, cpu, self_wall) in self.stats.items():
+            row = rows.setdefault(key[-1], [0, 0, 0.0, 0.0, 0.0])
+            row[0] += calls
+            row[1] += nbytes
+            row[2] += wall
+            row[3] += cpu
+            row[4] += self_wall
+        table = pd.DataFrame.from_dict(rows, orient='index',
+                                       columns=['calls', 'bytes', 'wall_s', 'cpu_s', 'self_s'])
+        table['mb_per_s'] = table['bytes'] / table['wall_s'] / 1e6
+        return table.sort_values('self_s', ascending=False)
+
+    def write_folded(self, path):
+        # One line per stack, with its self time in microseconds: the "folded" format
+        # read by flamegraph.pl, speedscope and most flame graph viewers.
+        with open(path, 'w', encoding='utf-8') as fout:
+            for key, stats in sorted(self.stats.items()):
+                fout.write(f"{';'.join(key)} {round(stats[4] * 1e6)}\n")
+
+
+profiler = StageProfiler()
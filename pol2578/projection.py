@@ -0,0 +1,213 @@
+"""Extract many fields of each tweet in a single pass, into typed Arrow columns.
+
+A field spec is a list of ``(name, paths, type)`` tuples.  A path is a
+dotted list of keys, such as ``'user.screen_name'``; ``[]`` maps the rest
+of the path over a list, as in ``'entities.hashtags[].text'``.  When a
+field has several paths, the first one that is present and not null gives
+the value, which is how tweet_parser chooses between the text of a
+retweet, of an extended tweet and of a plain tweet.  The types are:
+'string', 'text' (a string passed to html.unescape), 'int64', 'float64',
+'bool', 'timestamp' (the timestamp_ms or created_at of a tweet, in
+milliseconds, UTC), 'list<string>' and 'list<int64>'.
+
+The spec is compiled once into the source of a Python function, which
+looks up every path of every field in the decoded tweet, sharing the
+lookups of the objects the paths go through, and appends the values to one
+list per column.  Each line is decoded once, whatever the
+number of fields, and no dictionary is built per row.
+"""
+
+import html
+from datetime import datetime
+
+from .tweets import get_json_loads, open_compressed
+
+# The text, hashtags, mentions and links of a retweet are those of the original tweet, as in tweet_parser.
+def entity_paths(path):
+    return ['retweeted_status.extended_tweet.' + path, 'retweeted_status.' + path,
+            'extended_tweet.' + path, path]
+
+
+TWEET_FIELDS = [
+    ('id', 'id', 'int64'),
+    ('created_at', ['timestamp_ms', 'created_at'], 'timestamp'),
+    ('user', 'user.screen_name', 'string'),
+    ('user_id', 'user.id', 'int64'),
+    ('text', ['retweeted_status.extended_tweet.full_text', 'retweeted_status.text',
+              'extended_tweet.full_text', 'text'], 'text'),
+    ('lang', 'lang', 'string'),
+    ('retweet_of', 'retweeted_status.id', 'int64'),
+    ('in_reply_to_status_id', 'in_reply_to_status_id', 'int64'),
+    ('in_reply_to_user_id', 'in_reply_to_user_id', 'int64'),
+    ('hashtags', entity_paths('entities.hashtags[].text'), 'list<string>'),
+    ('mentions', entity_paths('entities.user_mentions[].screen_name'), 'list<string>'),
+    ('urls', entity_paths('entities.urls[].expanded_url'), 'list<string>'),
+]
+
+TYPES = ('string', 'text', 'int64', 'float64', 'bool', 'timestamp', 'list<string>', 'list<int64>')
+
+
+def tweet_milliseconds(value):
+    # timestamp_ms is a string of digits; created_at looks like 'Tue Sep 20 20:51:37 +0000 2016'.
+    if isinstance(value, str) and not value.isdigit():
+        return int(datetime.strptime(value, '%a %b %d %H:%M:%S %z %Y').timestamp()) * 1000
+    return int(value)
+
+
+def unescape(text):
+    return html.unescape(text) if '&' in text else text
+
+
+def arrow_type(name):
+    import pyarrow as pa
+    types = {'string': pa.string(), 'text': pa.string(), 'int64': pa.int64(), 'float64': pa.float64(),
+             'bool': pa.bool_(), 'timestamp': pa.timestamp('ms', tz='UTC'),
+             'list<string>': pa.list_(pa.string()), 'list<int64>': pa.list_(pa.int64())}
+    return types[name]
+
+
+def dig(value, keys):
+    for key in keys:
+        if value is None:
+            return None
+        value = value.get(key)
+    return value
+
+
+class TweetProjection:
+    """A field spec compiled into a function that projects decoded tweets into columns.
+
+    ``required`` names the fields without which a line is skipped (delete
+    notices and other messages of the streaming API have no id).  The
+    generated code is kept in ``source``.
+    """
+
+    def __init__(self, fields=TWEET_FIELDS, required=('id',)):
+        self.fields = []
+        for name, paths, type_name in fields:
+            if type_name not in TYPES:
+                raise ValueError(f"Unknown type {type_name!r} for field {name!r}.")
+            self.fields.append((name, [paths] if isinstance(paths, str) else list(paths), type_name))
+        self.names = [name for name, paths, type_name in self.fields]
+        unknown = set(required) - set(self.names)
+        if unknown:
+            raise ValueError(f"Required fields not in the spec: {sorted(unknown)}")
+        self.required = tuple(required)
+        self.source = self._compile()
+        namespace = {'dig': dig, 'unescape': unescape, 'tweet_milliseconds': tweet_milliseconds}
+        exec(compile(self.source, '<TweetProjection>', 'exec'), namespace)
+        self.project = namespace['project']
+
+    def _compile(self):
+        # Every object on the way to a value (tweet['retweeted_status'],
+        # tweet['retweeted_status']['extended_tweet'], ...) is looked up once,
+        # with get(), at the top of the function, and shared by the fields.
+        # Missing keys and null values give None instead of raising an exception.
+        objects = {(): 'tweet'}
+        prelude = []
+
+        def get(parent, key):
+            if parent == 'tweet':
+                return f"tweet.get({key!r})"
+            return f"{parent}.get({key!r}) if {parent} is not None else None"
+
+        def lookup(keys):
+            keys = tuple(keys)
+            if keys not in objects:
+                parent = lookup(keys[:-1])
+                objects[keys] = f"object{len(objects)}"
+                prelude.append(f"    {objects[keys]} = {get(parent, keys[-1])}")
+            return objects[keys]
+
+        body = []
+        for i, (name, paths, type_name) in enumerate(self.fields):
+            body.append(f"    # {name}")
+            for j, path in enumerate(paths):
+                head, _, rest = path.partition('[].')
+                keys = head.split('.')
+                if rest:
+                    if '[]' in rest:
+                        raise ValueError(f"Nested lists are not supported: {path!r}")
+                    items = lookup(keys)
+                    item_keys = rest.split('.')
+                    item = f"item.get({item_keys[0]!r})" if len(item_keys) == 1 else f"dig(item, {tuple(item_keys)!r})"
+                    expression = f"[{item} for item in {items}] if {items} is not None else None"
+                else:
+                    expression = get(lookup(keys[:-1]), keys[-1])
+                if j == 0:
+                    body.append(f"    value{i} = {expression}")
+                else:
+                    body.append(f"    if value{i} is None:")
+                    body.append(f"        value{i} = {expression}")
+            if name in self.required:
+                body.append(f"    if value{i} is None:")
+                body.append(f"        return False")
+            if type_name == 'text':
+                body.append(f"    if value{i} is not None:")
+                body.append(f"        value{i} = unescape(value{i})")
+            elif type_name == 'timestamp':
+                body.append(f"    if value{i} is not None:")
+                body.append(f"        value{i} = tweet_milliseconds(value{i})")
+        # Nothing is appended before all the required fields are found.
+        for i in range(len(self.fields)):
+            body.append(f"    append{i}(value{i})")
+        body.append("    return True")
+        header = f"def project(tweet, {', '.join(f'append{i}' for i in range(len(self.fields)))}):"
+        return "\n".join([header] + prelude + body) + "\n"
+
+    @property
+    def schema(self):
+        import pyarrow as pa
+        return pa.schema([(name, arrow_type(type_name)) for name, paths, type_name in self.fields])
+
+    def iter_batches(self, path, batch_size=100000, loads=None):
+        """Yield the fields of the tweets of a file (possibly compressed) as Arrow record batches.
+
+        Lines that cannot be decoded, or that lack a required field, are skipped.
+        """
+        import pyarrow as pa
+
+        loads = loads or get_json_loads()
+        project = self.project
+        schema = self.schema
+        columns = [[] for name in self.names]
+        appends = [column.append for column in columns]
+        nrows = 0
+        with open_compressed(path) as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    nrows += project(loads(line), *appends)
+                except (ValueError, AttributeError):
+                    # Malformed lines, and objects where a path expects another object.
+                    continue
+                if nrows == batch_size:
+                    yield pa.record_batch([pa.array(column, field.type) for column, field in zip(columns, schema)],
+                                          schema=schema)
+                    for column in columns:
+                        column.clear()
+                    nrows = 0
+        if nrows:
+            yield pa.record_batch([pa.array(column, field.type) for column, field in zip(columns, schema)],
+                                  schema=schema)
+
+    def read(self, path, loads=None):
+        """Return the fields of the tweets of a file as an Arrow table."""
+        import pyarrow as pa
+        return pa.Table.from_batches(list(self.iter_batches(path, loads=loads)), schema=self.schema)
+
+    def write(self, path, output, batch_size=100000, loads=None, compression='zstd'):
+        """Write the fields of the tweets of a file to a Parquet or Feather file, and return the number of rows."""
+        from .columnar import open_writer
+
+        file_format = 'feather' if output.endswith(('.feather', '.arrow')) else 'parquet'
+        writer = open_writer(output, self.schema, compression, file_format)
+        nrows = 0
+        try:
+            for batch in self.iter_batches(path, batch_size, loads):
+                writer.write_batch(batch)
+                nrows += batch.num_rows
+        finally:
+            writer.close()
+        return nrows
@@ -0,0 +1,391 @@
+"""A positional inverted index of speeches, with boolean and phrase queries.
+
+Speeches are lowercased and cut into ``\\w+`` tokens.  For each term, the
+index keeps the list of speeches that contain it, the number of occurrences
+in each, and their positions.  The three lists are delta-encoded (each
+number is stored as the difference with the previous one) and compressed as
+variable-length integers (varints): 7 bits per byte, the high bit telling
+whether another byte follows.  Both the encoding and the decoding are done
+on whole arrays with numpy.
+
+The index is a directory of segments.  Each call to ``add()`` writes a new
+segment, with a lexicon (.npz), the compressed postings (.postings) and the
+metadata of its speeches (.parquet), so that memory use depends on the size
+of a segment, not on the size of the corpus.  A query is run on every
+segment, and the postings files are memory-mapped.
+
+Queries combine words and "quoted phrases" with AND (the default), OR, NOT
+and parentheses::
+
+    index.search('"climate change" (carbon OR emissions) NOT coal', party='Labour')
+"""
+
+import glob
+import os
+import re
+
+TOKEN = re.compile(r'\w+')
+QUERY_TOKEN = re.compile(r'"[^"]*"|\(|\)|[^\s()"]+')
+METADATA = ('sitting', 'id', 'speaker', 'party', 'role', 'member_ref', 'topic', 'scene')
+
+
+def tokenize(text):
+    return TOKEN.findall(text.lower())
+
+
+def encode_varints(values):
+    """Encode an array of non-negative integers as varints, and return the bytes as a uint8 array."""
+    import numpy as np
+
+    values = np.asarray(values, dtype=np.uint64)
+    nbytes = np.ones(len(values), dtype=np.int64)
+    for k in range(1, 10):
+        nbytes += values >= (1 << (7 * k))
+    starts = np.cumsum(nbytes) - nbytes
+    out = np.empty(int(nbytes.sum()), dtype=np.uint8)
+    for k in range(int(nbytes.max()) if len(values) else 0):
+        mask = nbytes > k
+        byte = (values[mask] >> np.uint64(7 * k)) & np.uint64(127)
+        more = (nbytes[mask] > k + 1).astype(np.uint64) << np.uint64(7)
+        out[starts[mask] + k] = byte | more
+    return out
+
+
+def decode_varints(data):
+    """Decode a uint8 array of varints into an array of uint64."""
+    import numpy as np
+
+    data = np.asarray(data, dtype=np.uint8)
+    ends = np.flatnonzero(data < 128)
+    if len(ends) == len(data):
+        # Every integer fits in one byte, the most common case.
+        return data.astype(np.uint64)
+    starts = np.empty_like(ends)
+    starts[0] = 0
+    starts[1:] = ends[:-1] + 1
+    lengths = ends - starts + 1
+    values = data[starts].astype(np.uint64) & np.uint64(127)
+    # The k-th byte of the integers that have one adds 7 more bits.
+    for k in range(1, int(lengths.max())):
+        more = np.flatnonzero(lengths > k)
+        values[more] |= (data[starts[more] + k].astype(np.uint64) & np.uint64(127)) << np.uint64(7 * k)
+    return values
+
+
+def run_starts(*keys):
+    # Positions where any of the sorted key arrays changes value.
+    import numpy as np
+
+    change = np.zeros(len(keys[0]), dtype=bool)
+    if len(change):
+        change[0] = True
+    for key in keys:
+        change[1:] |= key[1:] != key[:-1]
+    return np.flatnonzero(change)
+
+
+def deltas(values, starts):
+    # Differences with the previous value, restarting at each run start.
+    import numpy as np
+
+    out = np.empty_like(values)
+    if len(values):
+        out[0] = values[0]
+        out[1:] = values[1:] - values[:-1]
+        out[starts] = values[starts]
+    return out
+
+
+def undo_deltas(values, counts):
+    # Cumulative sums restarting after every ``counts`` values.
+    import numpy as np
+
+    values = values.astype(np.int64)
+    total = np.cumsum(values)
+    before = np.concatenate(([0], total))[np.cumsum(counts) - counts]
+    return total - np.repeat(before, counts)
+
+
+def intersect_sorted(a, b):
+    # Intersection of two sorted arrays of unique values, without sorting again.
+    import numpy as np
+
+    if len(a) > len(b):
+        a, b = b, a
+    if not len(a):
+        return a
+    i = np.minimum(np.searchsorted(b, a), len(b) - 1)
+    return a[b[i] == a]
+
+
+class Segment:
+    """The lexicon and memory-mapped postings of one segment of the index."""
+
+    def __init__(self, path):
+        import numpy as np
+
+        with np.load(path + '.npz') as lexicon:
+            self.first_doc = int(lexicon['first_doc'])
+            self.ndocs = int(lexicon['ndocs'])
+            self.terms = lexicon['terms']
+            self.df = lexicon['df']
+            self.offsets = {name: lexicon[name] for name in ('docs', 'counts', 'positions')}
+        size = os.path.getsize(path + '.postings')
+        self.postings = np.memmap(path + '.postings', dtype=np.uint8, mode='r') if size else np.zeros(0, np.uint8)
+        self.path = path
+
+    def find(self, term_id):
+        import numpy as np
+        i = np.searchsorted(self.terms, term_id)
+        return i if i < len(self.terms) and self.terms[i] == term_id else None
+
+    def stream(self, name, i):
+        offsets = self.offsets[name]
+        return decode_varints(self.postings[offsets[i]:offsets[i + 1]])
+
+    def docs(self, i):
+        return self.first_doc + undo_deltas(self.stream('docs', i), [int(self.df[i])])
+
+    def positions(self, i):
+        counts = self.stream('counts', i).astype('int64')
+        return counts, undo_deltas(self.stream('positions', i), counts)
+
+
+def write_segment(path, first_doc, texts, vocabulary, new_terms):
+    """Index ``texts`` (speeches first_doc, first_doc + 1, ...) into the files of a segment."""
+    import numpy as np
+    import pandas as pd
+
+    tokens = []
+    lengths = []
+    for text in texts:
+        words = tokenize(text)
+        tokens.extend(words)
+        lengths.append(len(words))
+    codes, uniques = pd.factorize(np.array(tokens, dtype=object))
+    global_ids = np.empty(len(uniques), dtype=np.int64)
+    for i, term in enumerate(uniques):
+        term_id = vocabulary.get(term)
+        if term_id is None:
+            term_id = vocabulary[term] = len(vocabulary)
+            new_terms.append(term)
+        global_ids[i] = term_id
+    lengths = np.array(lengths, dtype=np.int64)
+    term_ids = global_ids[codes]
+    docs = np.repeat(np.arange(first_doc, first_doc + len(lengths)), lengths)
+    positions = np.arange(len(tokens)) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    # A stable sort by term keeps the occurrences of each term in (speech, position) order.
+    order = np.argsort(term_ids, kind='stable')
+    term_ids, docs, positions = term_ids[order], docs[order], positions[order]
+
+    term_starts = run_starts(term_ids)
+    doc_starts = run_starts(term_ids, docs)
+    terms = term_ids[term_starts]
+    doc_terms = term_ids[doc_starts]
+    doc_ids = docs[doc_starts]
+    counts = np.diff(np.append(doc_starts, len(docs)))
+    df = np.diff(np.append(run_starts(doc_terms), len(doc_terms)))
+
+    # The first speech of each term is stored as is, relative to the segment.
+    doc_deltas = deltas(doc_ids - first_doc, run_starts(doc_terms))
+    position_deltas = deltas(positions, doc_starts)
+
+    streams = {}
+    offsets = {}
+    base = 0
+    for name, values, owners in (('docs', doc_deltas, doc_terms),
+                                 ('counts', counts, doc_terms),
+                                 ('positions', position_deltas, term_ids)):
+        encoded = encode_varints(values)
+        # Byte range of each term in the stream: the last byte of a varint is under 128.
+        value_bytes = np.diff(np.flatnonzero(encoded < 128) + 1, prepend=0)
+        term_bytes = np.add.reduceat(value_bytes, run_starts(owners)) if len(owners) else value_bytes
+        offsets[name] = base + np.concatenate(([0], np.cumsum(term_bytes)))
+        streams[name] = encoded
+        base += len(encoded)
+
+    with open(path + '.postings', 'wb') as fout:
+        for name in ('docs', 'counts', 'positions'):
+            fout.write(streams[name].tobytes())
+    np.savez(path + '.tmp.npz', first_doc=first_doc, ndocs=len(lengths), terms=terms, df=df, **offsets)
+
+
+class SpeechIndex:
+    """A persistent positional index of speeches, stored in ``directory``."""
+
+    def __init__(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.vocabulary = {}
+        try:
+            with open(os.path.join(directory, 'vocabulary.txt'), encoding='utf-8') as f:
+                for i, term in enumerate(f.read().splitlines()):
+                    self.vocabulary[term] = i
+        except FileNotFoundError:
+            pass
+        paths = sorted(glob.glob(os.path.join(directory, 'segment-*.npz')))
+        self.segments = [Segment(path[:-len('.npz')]) for path in paths if not path.endswith('.tmp.npz')]
+        self._metadata = None
+
+    def __len__(self):
+        return sum(segment.ndocs for segment in self.segments)
+
+    def add(self, table):
+        """Index the speeches of a SpeechTable as a new segment."""
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        path = os.path.join(self.directory, f"segment-{len(self.segments):05d}")
+        new_terms = []
+        write_segment(path, len(self), table.data['text'], self.vocabulary, new_terms)
+        pq.write_table(pa.table({column: table.data[column] for column in METADATA}), path + '.parquet')
+        with open(os.path.join(self.directory, 'vocabulary.txt'), 'a', encoding='utf-8') as fout:
+            fout.write(''.join(term + '\n' for term in new_terms))
+        # The lexicon is renamed last: a segment without it is ignored.
+        os.replace(path + '.tmp.npz', path + '.npz')
+        self.segments.append(Segment(path))
+        self._metadata = None
+
+    def docs(self, term):
+        """Return the sorted ids of the speeches that contain ``term``."""
+        import numpy as np
+
+        term_id = self.vocabulary.get(term.lower())
+        found = [np.zeros(0, dtype=np.int64)]
+        if term_id is not None:
+            for segment in self.segments:
+                i = segment.find(term_id)
+                if i is not None:
+                    found.append(segment.docs(i))
+        return np.concatenate(found)
+
+    def occurrences(self, term, candidates=None):
+        """Return the speech ids and positions of every occurrence of ``term``."""
+        import numpy as np
+
+        term_id = self.vocabulary.get(term.lower())
+        docs = [np.zeros(0, dtype=np.int64)]
+        positions = [np.zeros(0, dtype=np.int64)]
+        if term_id is not None:
+            for segment in self.segments:
+                i = segment.find(term_id)
+                if i is None:
+                    continue
+                segment_docs = segment.docs(i)
+                if candidates is None:
+                    counts, segment_positions = segment.positions(i)
+                else:
+                    # The filter is applied to the speeches, then spread over their positions.
+                    keep = np.isin(segment_docs, candidates, assume_unique=True)
+                    if not keep.any():
+                        continue
+                    counts, segment_positions = segment.positions(i)
+                    segment_positions = segment_positions[np.repeat(keep, counts)]
+                    segment_docs, counts = segment_docs[keep], counts[keep]
+                docs.append(np.repeat(segment_docs, counts))
+                positions.append(segment_positions)
+        return np.concatenate(docs), np.concatenate(positions)
+
+    def phrase(self, words):
+        """Return the ids of the speeches that contain the words in this order."""
+        import numpy as np
+
+        words = [word.lower() for word in words]
+        if not words:
+            return np.zeros(0, dtype=np.int64)
+        if len(words) == 1:
+            return self.docs(words[0])
+        candidates = self.docs(words[0])
+        for word in words[1:]:
+            candidates = intersect_sorted(candidates, self.docs(word))
+        matches = None
+        for i, word in enumerate(words):
+            docs, positions = self.occurrences(word, candidates)
+            # Each occurrence is mapped to the position where the phrase would
+            # start.  The keys come out sorted, in (speech, position) order.
+            keys = (docs << 32) + positions - i
+            matches = keys if matches is None else intersect_sorted(matches, keys)
+        docs = matches >> 32
+        return docs[np.append(True, docs[1:] != docs[:-1])] if len(docs) else docs
+
+    def search(self, query, **filters):
+        """Return the sorted ids of the speeches that match a query and metadata filters.
+
+        For example, ``search('"climate change" NOT coal', party='Labour')``.
+        """
+        import numpy as np
+
+        tokens = QUERY_TOKEN.findall(query)
+        docs, i = self._or(tokens, 0)
+        if i != len(tokens):
+            raise ValueError(f"Unexpected {tokens[i]!r} in query {query!r}.")
+        if filters:
+            metadata = self.metadata()
+            keep = np.ones(len(docs), dtype=bool)
+            for column, value in filters.items():
+                keep &= metadata[column].to_numpy()[docs] == value
+            docs = docs[keep]
+        return docs
+
+    def _or(self, tokens, i):
+        import numpy as np
+        docs, i = self._and(tokens, i)
+        while i < len(tokens) and tokens[i] == 'OR':
+            other, i = self._and(tokens, i + 1)
+            docs = np.union1d(docs, other)
+        return docs, i
+
+    def _and(self, tokens, i):
+        docs, i = self._not(tokens, i)
+        while i < len(tokens) and tokens[i] not in ('OR', ')'):
+            if tokens[i] == 'AND':
+                i += 1
+            other, i = self._not(tokens, i)
+            docs = intersect_sorted(docs, other)
+        return docs, i
+
+    def _not(self, tokens, i):
+        import numpy as np
+        if i < len(tokens) and tokens[i] == 'NOT':
+            docs, i = self._not(tokens, i + 1)
+            return np.setdiff1d(np.arange(len(self)), docs, assume_unique=True), i
+        return self._atom(tokens, i)
+
+    def _atom(self, tokens, i):
+        if i == len(tokens):
+            raise ValueError("Incomplete query.")
+        token = tokens[i]
+        if token == '(':
+            docs, i = self._or(tokens, i + 1)
+            if i == len(tokens) or tokens[i] != ')':
+                raise ValueError("Missing closing parenthesis in query.")
+            return docs, i + 1
+        if token in ('AND', 'OR', ')'):
+            raise ValueError(f"Unexpected {token!r} in query.")
+        # A quoted phrase, or a word that the tokenizer splits (such as "co-operation").
+        return self.phrase(tokenize(token.strip('"'))), i + 1
+
+    def metadata(self, docs=None):
+        """Return the metadata of the speeches as a data frame, for all speeches or the given ids."""
+        import pandas as pd
+
+        if self._metadata is None:
+            frames = [pd.read_parquet(segment.path + '.parquet') for segment in self.segments]
+            self._metadata = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=METADATA)
+        return self._metadata if docs is None else self._metadata.iloc[docs]
+
+
+def index_speeches(paths, directory, segment_size=50000):
+    """Add the speeches of xml files to the index in ``directory``, ``segment_size`` speeches per segment."""
+    from .speeches import SpeechTable, read_speeches
+
+    index = SpeechIndex(directory)
+    table = SpeechTable()
+    for path in paths:
+        table.extend(read_speeches(path))
+        if len(table) >= segment_size:
+            index.add(table)
+            table = SpeechTable()
+    if len(table):
+        index.add(table)
+    return index
@@ -0,0 +1,143 @@
+"""Streaming extraction of speeches from the PoliticalMashup proceedings xml files."""
+
+import glob
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from .profiling import profiler
+
+PM = "http://www.politicalmashup.nl"
+
+
+def free_element(elem):
+    # Free the element and everything parsed before it.
+    elem.clear(keep_tail=True)
+    for ancestor in elem.iterancestors():
+        while ancestor.getprevious() is not None:
+            del ancestor.getparent()[0]
+    while elem.getprevious() is not None:
+        del elem.getparent()[0]
+
+
+def iter_speeches(path, namespace=PM):
+    """Yield ``(speaker, speech)`` pairs from a proceedings file, in constant memory."""
+    from lxml import etree
+    speech_tag = '{%s}speech' % namespace
+    speaker_attr = '{%s}speaker' % namespace
+    for event, elem in etree.iterparse(path, events=('end',), tag=speech_tag, huge_tree=True):
+        with profiler.stage('etree.tostring'):
+            speech = etree.tostring(elem, method="text", encoding="unicode", with_tail=False)
+        yield elem.get(speaker_attr), speech
+        free_element(elem)
+
+
+class SpeechTable:
+    """Speeches and their metadata, stored as one list per column.
+
+    The columns with few distinct values, listed in ``categorical``, become
+    pandas categoricals and Arrow dictionary arrays on conversion: each
+    distinct party or debate title is stored once, with an integer code per
+    speech.  The lists are kept while a table is built, and merged tables are
+    encoded once, as a whole.
+    """
+
+    columns = ('sitting', 'id', 'speaker', 'party', 'role', 'member_ref', 'topic', 'scene', 'text')
+    categorical = ('sitting', 'party', 'role', 'topic', 'scene')
+
+    def __init__(self):
+        self.data = {column: [] for column in self.columns}
+
+    def __len__(self):
+        return len(self.data['id'])
+
+    def extend(self, other):
+        for column in self.columns:
+            self.data[column].extend(other.data[column])
+
+    def rows(self):
+        return zip(*(self.data[column] for column in self.columns))
+
+    def to_pandas(self):
+        import pandas as pd
+        return pd.DataFrame({column: pd.Categorical(values) if column in self.categorical else values
+                             for column, values in self.data.items()}, columns=self.columns)
+
+    def to_arrow(self):
+        import pyarrow as pa
+        arrays = []
+        for column in self.columns:
+            array = pa.array(self.data[column], pa.string())
+            arrays.append(array.dictionary_encode() if column in self.categorical else array)
+        return pa.table(arrays, names=self.columns)
+
+
+def read_speeches(path, namespace=PM):
+    """Return a SpeechTable with the speeches of a sitting, their attributes and debate titles."""
+    from lxml import etree
+    pm = '{%s}' % namespace
+    topic_tag, scene_tag, speech_tag = pm + 'topic', pm + 'scene', pm + 'speech'
+    table = SpeechTable()
+    sitting = os.path.basename(path)[:-len('.xml')]
+    # Bind the list methods once, outside of the loop.
+    append = {column: values.append for column, values in table.data.items()}
+    topic = scene = None
+    with profiler.stage('read_speeches', os.path.getsize(path)):
+        for event, elem in etree.iterparse(path, events=('start', 'end'),
+                                           tag=(topic_tag, scene_tag, speech_tag), huge_tree=True):
+            if elem.tag == speech_tag:
+                if event == 'end':
+                    append['sitting'](sitting)
+                    append['id'](elem.get(pm + 'id'))
+                    append['speaker'](elem.get(pm + 'speaker'))
+                    append['party'](elem.get(pm + 'party'))
+                    append['role'](elem.get(pm + 'role'))
+                    append['member_ref'](elem.get(pm + 'member-ref'))
+                    append['topic'](topic)
+                    append['scene'](scene)
+                    with profiler.stage('etree.tostring'):
+                        text = etree.tostring(elem, method="text", encoding="unicode", with_tail=False)
+                    append['text'](text)
+                    free_element(elem)
+            elif event == 'start':
+                if elem.tag == topic_tag:
+                    topic = elem.get(pm + 'title')
+                else:
+                    scene = elem.get(pm + 'title')
+            else:
+                if elem.tag == topic_tag:
+                    topic = None
+                scene = None
+    return table
+
+
+def extract_sitting(path):
+    start = time.perf_counter()
+    try:
+        table = read_speeches(path)
+        error = None
+    except Exception as e:
+        table = SpeechTable()
+        error = f"{type(e).__name__}: {e}"
+    return path, table, time.perf_counter() - start, error
+
+
+def build_corpus(paths, pattern='uk.proc.d.*.xml', workers=None, chunksize=8):
+    """Extract every sitting in a process pool.
+
+    ``paths`` is a directory, whose files matching ``pattern`` are read, or a
+    list of files.  Returns the merged SpeechTable, in file name order, and a
+    report with one ``(sitting, speeches, seconds, error)`` tuple per file.
+    """
+    if isinstance(paths, str):
+        paths = sorted(glob.glob(os.path.join(paths, pattern)))
+    corpus = SpeechTable()
+    report = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        # map() returns the results in the order of the sorted file list,
+        # whichever worker finishes first.
+        for path, table, elapsed, error in executor.map(extract_sitting, paths, chunksize=chunksize):
+            sitting = os.path.basename(path)[:-len('.xml')]
+            corpus.extend(table)
+            report.append((sitting, len(table), elapsed, error))
+    return corpus, report
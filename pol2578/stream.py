@@ -0,0 +1,261 @@
+"""Consume a live feed of tweets (newline-delimited JSON) with asyncio.
+
+The event loop only moves bytes around.  The stages are connected by a
+bounded queue, so that a slow stage makes the previous ones wait instead of
+letting memory grow: the reader cuts the feed into batches of lines, each
+batch is parsed with tweet_parser in a process pool, and the writer appends
+the parsed batches to disk in a thread.
+
+When the parsers or the disk fall behind, the reader stops reading from the
+socket, and the operating system in turn slows down the sender (TCP flow
+control).  Batches are written in the order they were received.
+
+The source is ``tcp://host:port`` (or ``host:port``), ``unix:/path/to/socket``,
+or ``-`` for standard input, which must then be a pipe.  ``start_replay_server``
+serves a file of tweets over TCP or a Unix socket, to test the consumer.
+"""
+
+import asyncio
+import csv
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from .tweets import get_json_loads, open_compressed, tweet_parser
+
+# Reading from the connection pauses when this many bytes are waiting in the buffer.
+BUFFER_LIMIT = 4 * 1024 * 1024
+READ_SIZE = 256 * 1024
+
+
+def parse_lines(data, backend=None):
+    """Parse and unescape the lines of a block of bytes.
+
+    Returns the (user, tweet) rows and the number of lines skipped: lines
+    that are not tweets, such as delete notices, and malformed lines.
+    """
+    import html
+    loads = get_json_loads(backend)
+    tweets = []
+    skipped = 0
+    for line in data.split(b'\n'):
+        if not line.strip():
+            continue
+        try:
+            user, text = tweet_parser(line, loads=loads)
+        except (ValueError, KeyError, TypeError):
+            skipped += 1
+            continue
+        tweets.append((user, html.unescape(text)))
+    return tweets, skipped
+
+
+class TweetSink:
+    """Write batches of (user, tweet) rows to a CSV file, or to numbered Parquet/Feather parts.
+
+    CSV rows are appended and flushed after each batch, so that the file can
+    be read while the stream runs.  Columnar formats can only be read once
+    their file is closed: a part is written every ``part_size`` tweets, named
+    after ``output`` with a number (tweets-00000.parquet, ...).
+    """
+
+    def __init__(self, output, part_size=100000):
+        self.output = output
+        self.part_size = part_size
+        self.rows = []
+        self.parts = 0
+        self.fout = None
+        if output.endswith('.csv'):
+            new = not os.path.exists(output) or os.path.getsize(output) == 0
+            self.fout = open(output, 'a', encoding='utf-8', newline='')
+            self.writer = csv.writer(self.fout)
+            if new:
+                self.writer.writerow(('user', 'tweet'))
+
+    def write(self, tweets):
+        if self.fout is not None:
+            self.writer.writerows(tweets)
+            self.fout.flush()
+            return
+        self.rows.extend(tweets)
+        if len(self.rows) >= self.part_size:
+            self.write_part()
+
+    def write_part(self):
+        from .columnar import write_rows
+        root, extension = os.path.splitext(self.output)
+        while os.path.exists(f"{root}-{self.parts:05d}{extension}"):
+            self.parts += 1
+        write_rows(self.rows, f"{root}-{self.parts:05d}{extension}", ('user', 'tweet'))
+        self.parts += 1
+        self.rows = []
+
+    def close(self):
+        if self.fout is not None:
+            self.fout.close()
+        elif self.rows:
+            self.write_part()
+
+
+async def open_source(source):
+    """Return the asyncio (reader, writer) of a tcp://, unix: or - (stdin) source.
+
+    The writer, None for stdin, must be kept until the end: the connection
+    is closed with it.
+    """
+    if source == '-':
+        loop = asyncio.get_running_loop()
+        reader = asyncio.StreamReader(limit=BUFFER_LIMIT)
+        await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), sys.stdin.buffer)
+        return reader, None
+    if source.startswith('unix:'):
+        return await asyncio.open_unix_connection(source[len('unix:'):], limit=BUFFER_LIMIT)
+    if source.startswith('tcp://'):
+        source = source[len('tcp://'):]
+    host, port = source.rsplit(':', 1)
+    return await asyncio.open_connection(host, int(port), limit=BUFFER_LIMIT)
+
+
+async def consume(source, output, batch_size=1000, flush_interval=1.0, max_pending=None,
+                  workers=None, backend=None, part_size=100000):
+    """Read tweets from ``source`` until it closes, and write them to ``output``.
+
+    A batch of about ``batch_size`` lines is sent to the parsers when it is
+    full, or ``flush_interval`` seconds after its first bytes arrived.  At
+    most ``max_pending`` batches are parsed or waiting to be written at any
+    time.  Returns statistics about the run.
+    """
+    loop = asyncio.get_running_loop()
+    workers = workers or os.cpu_count()
+    max_pending = max_pending or 2 * workers
+    pending = asyncio.Queue(maxsize=max_pending)
+    stats = {'lines': 0, 'tweets': 0, 'skipped': 0, 'batches': 0, 'max_pending': 0}
+    # The workers are started before connecting.  Forked later, they would
+    # inherit the sockets open at that time, among them the server side of
+    # a replay server running in the same event loop, and the stream would
+    # never end when the server closes it.
+    executor = ProcessPoolExecutor(max_workers=workers)
+    await asyncio.gather(*(loop.run_in_executor(executor, os.getpid) for i in range(workers)))
+    reader, connection = await open_source(source)
+    sink = TweetSink(output, part_size)
+    start = time.perf_counter()
+
+    # The batches sent to the parsers and not parsed yet, to cancel them on error.
+    in_flight = set()
+
+    async def submit(data):
+        future = executor.submit(parse_lines, data, backend)
+        in_flight.add(future)
+        future.add_done_callback(in_flight.discard)
+        # put() waits while max_pending batches are in flight: this is the backpressure.
+        await pending.put(asyncio.wrap_future(future))
+        stats['max_pending'] = max(stats['max_pending'], pending.qsize())
+
+    async def read():
+        pieces = []
+        nlines = 0
+        deadline = None
+        while True:
+            timeout = None if deadline is None else max(deadline - loop.time(), 0)
+            try:
+                data = await asyncio.wait_for(reader.read(READ_SIZE), timeout)
+            except asyncio.TimeoutError:
+                # A cancelled read() leaves the bytes received in the buffer.
+                data = None
+            if data == b'':
+                break
+            if data:
+                if deadline is None:
+                    deadline = loop.time() + flush_interval
+                pieces.append(data)
+                nlines += data.count(b'\n')
+                if nlines < batch_size:
+                    continue
+            # The batch is full, or its deadline has passed: its complete lines
+            # are sent, and the incomplete last line waits for the next batch.
+            data = b''.join(pieces)
+            end = data.rfind(b'\n') + 1
+            if end:
+                await submit(data[:end])
+            pieces = [data[end:]] if end < len(data) else []
+            nlines = 0
+            deadline = loop.time() + flush_interval if pieces else None
+        if pieces:
+            await submit(b''.join(pieces))
+        await pending.put(None)
+
+    async def write():
+        while True:
+            parsing = await pending.get()
+            if parsing is None:
+                return
+            tweets, skipped = await parsing
+            await loop.run_in_executor(None, sink.write, tweets)
+            stats['lines'] += len(tweets) + skipped
+            stats['tweets'] += len(tweets)
+            stats['skipped'] += skipped
+            stats['batches'] += 1
+
+    try:
+        await asyncio.gather(read(), write())
+    finally:
+        if connection is not None:
+            connection.close()
+        await loop.run_in_executor(None, sink.close)
+        # shutdown(cancel_futures=True) would need Python 3.9.
+        for future in list(in_flight):
+            future.cancel()
+        executor.shutdown()
+    stats['seconds'] = time.perf_counter() - start
+    stats['tweets_per_second'] = stats['tweets'] / stats['seconds'] if stats['seconds'] else 0.0
+    return stats
+
+
+def consume_stream(source, output, **kwargs):
+    """Run ``consume`` in a new event loop (from a script, not from a notebook)."""
+    return asyncio.run(consume(source, output, **kwargs))
+
+
+async def start_replay_server(path, host='127.0.0.1', port=0, unix=None, repeat=1, rate=None):
+    """Serve the lines of a tweet file to every client that connects, then close the connection.
+
+    The file is sent ``repeat`` times, at ``rate`` lines per second if given.
+    Returns the asyncio server; with port=0, the port is chosen by the system
+    and given by ``server.sockets[0].getsockname()[1]``.
+    """
+
+    async def handle(reader, writer):
+        start = time.perf_counter()
+        nlines = 0
+        try:
+            for i in range(repeat):
+                with open_compressed(path) as f:
+                    for line in f:
+                        if not line.endswith(b'\n'):
+                            line += b'\n'
+                        writer.write(line)
+                        nlines += 1
+                        if nlines % 100 == 0:
+                            # drain() waits while the client is not reading fast enough.
+                            await writer.drain()
+                            if rate:
+                                delay = nlines / rate - (time.perf_counter() - start)
+                                if delay > 0:
+                                    await asyncio.sleep(delay)
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    if unix is not None:
+        return await asyncio.start_unix_server(handle, unix)
+    return await asyncio.start_server(handle, host, port)
+
+
+async def replay(path, host='127.0.0.1', port=9000, unix=None, repeat=1, rate=None):
+    """Run a replay server until it is interrupted."""
+    server = await start_replay_server(path, host, port, unix, repeat, rate)
+    async with server:
+        await server.serve_forever()
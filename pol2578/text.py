@@ -0,0 +1,215 @@
+"""Word filtering, text cleaning pipelines and lexicon sentiment scoring."""
+
+import html
+
+SENTIMENT = {'happy' : 'positive',
+             'joyful' : 'positive',
+             'content' : 'positive',
+             'sad' : 'negative',
+             'depressed' : 'negative',
+             'frustrated' : 'negative'}
+
+
+WORDS_TO_REMOVE = ['Canada','bill','government','law']
+
+
+def remove_words(text):
+    words_to_remove = WORDS_TO_REMOVE
+    text = text.split()
+    text = [w for w in text if w not in words_to_remove]
+    text = ' '.join(text)
+    return text
+
+
+class WordFilter:
+    """Remove words and multi-word expressions from texts.
+
+    Single words are looked up in a frozenset; expressions are matched on
+    tokens, longest first, with a tree of dictionaries.
+    """
+
+    def __init__(self, words):
+        self.words = frozenset(w for w in words if len(w.split()) == 1)
+        self.phrases = {}
+        for phrase in words:
+            tokens = phrase.split()
+            if len(tokens) > 1:
+                node = self.phrases
+                for token in tokens:
+                    node = node.setdefault(token, {})
+                node[None] = True  # Marks the end of an expression.
+
+    def __call__(self, text):
+        tokens = text.split()
+        if not self.phrases:
+            return ' '.join([w for w in tokens if w not in self.words])
+        return ' '.join(self.filter_tokens(tokens))
+
+    def filter_tokens(self, tokens):
+        """Return the list of the tokens that are not removed."""
+        if not self.phrases:
+            return [w for w in tokens if w not in self.words]
+        kept = []
+        i = 0
+        n = len(tokens)
+        while i < n:
+            node = self.phrases.get(tokens[i])
+            match = 0
+            j = i
+            while node is not None:
+                j += 1
+                if None in node:
+                    match = j - i
+                if j == n:
+                    break
+                node = node.get(tokens[j])
+            if match:
+                i += match
+                continue
+            if tokens[i] not in self.words:
+                kept.append(tokens[i])
+            i += 1
+        return kept
+
+    def batch(self, texts):
+        return [self(text) for text in texts]
+
+
+class TextPipeline:
+    """A sequence of cleaning steps, compiled into a single function.
+
+    Each stage is 'lower', 'unescape' (html.unescape), 'strip', a WordFilter,
+    or any function from string to string.  str.lower, html.unescape,
+    str.strip and remove_words are recognized, so that the stages can be
+    written as the chained calls they replace::
+
+        clean = TextPipeline([html.unescape, str.lower, WordFilter(stopwords), str.strip])
+        clean(text) == html.unescape(text).lower() ... .strip()
+
+    The output is the same as calling the stages one after the other, but the
+    compiled function splits the text once for consecutive word filters
+    (the words of those without expressions are merged in one set), skips
+    strip when the text cannot have leading or trailing white space, and
+    only calls html.unescape on texts that contain '&'.  The generated
+    code is kept in ``source``.
+    """
+
+    def __init__(self, stages):
+        self.stages = [self._stage(stage) for stage in stages]
+        self.source, namespace = self._compile()
+        code = compile(self.source, '<TextPipeline>', 'exec')
+        exec(code, namespace)
+        self.clean = namespace['clean']
+        self.batch = namespace['batch']
+
+    @staticmethod
+    def _stage(stage):
+        known = {str.lower: 'lower', html.unescape: 'unescape', str.strip: 'strip'}
+        if stage is remove_words:
+            return WordFilter(WORDS_TO_REMOVE)
+        if isinstance(stage, WordFilter) or stage in ('lower', 'unescape', 'strip'):
+            return stage
+        if callable(stage):
+            return known.get(stage, stage)
+        raise ValueError(f"Unknown stage: {stage!r}")
+
+    def _compile(self):
+        namespace = {'unescape': html.unescape}
+        lines = []
+        tokens = False      # Whether the text is currently split in the list ``tokens``.
+        normalized = False  # Whether the text is known to have no leading or trailing white space.
+        words = None        # The set of words of the last filter, while more words can be merged in it.
+
+        def join():
+            lines.append("text = ' '.join(tokens)")
+            return False
+
+        for stage in self.stages:
+            if isinstance(stage, WordFilter):
+                if not tokens:
+                    lines.append("tokens = text.split()")
+                    tokens = True
+                if not stage.phrases and words is not None:
+                    words.update(stage.words)
+                    continue
+                name = f"filter{len(namespace)}"
+                if stage.phrases:
+                    namespace[name] = stage.filter_tokens
+                    lines.append(f"tokens = {name}(tokens)")
+                    words = None
+                else:
+                    words = namespace[name] = set(stage.words)
+                    lines.append(f"tokens = [w for w in tokens if w not in {name}]")
+                normalized = True
+                continue
+            words = None
+            if stage == 'strip':
+                if not tokens and not normalized:
+                    lines.append("text = text.strip()")
+                    normalized = True
+                continue
+            if tokens:
+                tokens = join()
+            if stage == 'lower':
+                # Lowercasing never creates white space: the text stays normalized.
+                lines.append("text = text.lower()")
+            elif stage == 'unescape':
+                lines.append("if '&' in text:")
+                lines.append("    text = unescape(text)")
+                normalized = False
+            else:
+                name = f"function{len(namespace)}"
+                namespace[name] = stage
+                lines.append(f"text = {name}(text)")
+                normalized = False
+        if tokens:
+            join()
+        body = lines or ["pass"]
+        source = "\n".join(["def clean(text):"] + ["    " + line for line in body] + ["    return text", "", "",
+                             "def batch(texts):", "    cleaned = []", "    append = cleaned.append",
+                             "    for text in texts:"] + ["        " + line for line in body] +
+                            ["        append(text)", "    return cleaned", ""])
+        return source, namespace
+
+    def __call__(self, text):
+        return self.clean(text)
+
+    def __reduce__(self):
+        # The compiled functions cannot be pickled: other processes compile the stages again.
+        return TextPipeline, (self.stages,)
+
+
+def score_corpus(documents, lexicon=SENTIMENT, chunk_size=100000):
+    """Return the ``(positive - negative) / len(tokens)`` score of each document, as a numpy array.
+
+    ``lexicon`` maps words to 'positive' or 'negative'.  Empty documents get nan.
+    """
+    import numpy as np
+    import pandas as pd
+
+    polarities = {'positive': 1, 'negative': -1}
+    scores = []
+    documents = iter(documents)
+    while True:
+        tokens = []
+        lengths = []
+        for document in documents:
+            words = document.split()
+            tokens.extend(words)
+            lengths.append(len(words))
+            if len(lengths) == chunk_size:
+                break
+        if not lengths:
+            break
+        codes, vocabulary = pd.factorize(np.array(tokens, dtype=object))
+        polarity = np.array([polarities.get(lexicon.get(word), 0) for word in vocabulary], dtype=np.int8)
+        token_polarity = polarity[codes]
+        document_ids = np.repeat(np.arange(len(lengths)), lengths)
+        positive = np.bincount(document_ids, weights=token_polarity == 1, minlength=len(lengths))
+        negative = np.bincount(document_ids, weights=token_polarity == -1, minlength=len(lengths))
+        # Empty documents get a score of nan instead of raising an error.
+        with np.errstate(invalid='ignore'):
+            scores.append((positive - negative) / np.array(lengths))
+        if len(lengths) < chunk_size:
+            break
+    return np.concatenate(scores) if scores else np.array([])
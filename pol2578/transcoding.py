@@ -0,0 +1,128 @@
+"""Encoding detection and streaming conversion of text files."""
+
+import codecs
+import glob
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+BOMS = [(codecs.BOM_UTF8, 'utf-8-sig'),
+        (codecs.BOM_UTF32_LE, 'utf-32'), (codecs.BOM_UTF32_BE, 'utf-32'),
+        (codecs.BOM_UTF16_LE, 'utf-16'), (codecs.BOM_UTF16_BE, 'utf-16')]
+
+
+def detect_encoding(path, sample_size=64*1024):
+    """Guess the encoding of a file from its first ``sample_size`` bytes."""
+    with open(path, 'rb') as f:
+        sample = f.read(sample_size)
+    for bom, encoding in BOMS:
+        if sample.startswith(bom):
+            return encoding
+    try:
+        # With final=False, a character cut at the end of the sample is not an error.
+        codecs.getincrementaldecoder('utf-8')().decode(sample, final=False)
+        return 'utf-8'
+    except UnicodeDecodeError:
+        pass
+    return guess_legacy_encoding(sample)
+
+
+def guess_legacy_encoding(sample):
+    """Guess the encoding of bytes that are not utf-8."""
+    try:
+        from charset_normalizer import from_bytes
+        best = from_bytes(sample).best()
+        if best is not None:
+            # Several code pages often decode the sample identically: prefer the most common one.
+            if 'cp1252' in best.could_be_from_charset:
+                return 'cp1252'
+            return best.encoding
+    except ImportError:
+        pass
+    return 'latin-1'
+
+
+def western_encoding(sample):
+    """Choose between cp1252 and latin-1 for bytes found after a long ascii start.
+
+    Such a sample is mostly ascii, and charset_normalizer then often guesses
+    a rare code page, such as mac_iceland or cp1250, that garbles the
+    accented letters.  Its guess is only kept when it is cp1252 or latin-1
+    with little chaos; otherwise cp1252 is used if it decodes the sample,
+    and latin-1, which accepts any byte, if it does not.
+    """
+    try:
+        from charset_normalizer import from_bytes
+        best = from_bytes(sample).best()
+        if best is not None and best.chaos < 0.1:
+            name = codecs.lookup(best.encoding).name
+            if name in ('cp1252', 'iso8859-1'):
+                return best.encoding
+    except ImportError:
+        pass
+    try:
+        sample.decode('cp1252')
+        return 'cp1252'
+    except UnicodeDecodeError:
+        return 'latin-1'
+
+
+def copy_validated(source, destination, encoding, chunk_size=1024*1024):
+    """Copy ``source`` as it is, raising UnicodeDecodeError if it is not valid ``encoding``.
+
+    The error is raised with the chunk where it happened as its ``object``.
+    """
+    decoder = codecs.getincrementaldecoder(encoding)()
+    with open(source, 'rb') as f, open(destination, 'wb') as fout:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            decoder.decode(chunk)
+            fout.write(chunk)
+        decoder.decode(b'', final=True)
+
+
+def transcode(source, destination, encoding=None, target='utf-8', chunk_size=1024*1024):
+    """Convert ``source`` to ``target`` in chunks, and return the source encoding.
+
+    A file already in ``target`` is copied, and checked while it is copied.
+    When the encoding was detected from the start of the file, and an
+    invalid byte comes later, the file is converted again from cp1252 or
+    latin-1, chosen with the bytes from that point.
+    """
+    detected = encoding is None
+    encoding = encoding or detect_encoding(source)
+    if codecs.lookup(encoding).name == codecs.lookup(target).name:
+        try:
+            copy_validated(source, destination, encoding, chunk_size)
+            return encoding
+        except UnicodeDecodeError as e:
+            if not detected:
+                raise
+            # The start of the file is ascii: the guess is made from the bytes
+            # from the first one that is not.
+            encoding = western_encoding(e.object[e.start:e.start + 64*1024])
+    decoder = codecs.getincrementaldecoder(encoding)()
+    encoder = codecs.getincrementalencoder(target)()
+    with open(source, 'rb') as f, open(destination, 'wb') as fout:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            fout.write(encoder.encode(decoder.decode(chunk)))
+        fout.write(encoder.encode(decoder.decode(b'', final=True), final=True))
+    return encoding
+
+
+def transcode_file(paths):
+    source, destination = paths
+    try:
+        return transcode(source, destination)
+    except (OSError, UnicodeError, LookupError) as e:
+        return f"{type(e).__name__}: {e}"
+
+
+def transcode_directory(source_dir, destination_dir, pattern='*.txt', workers=None):
+    """Convert the matching files of a directory to utf-8 in parallel.
+
+    Returns a dictionary with the detected encoding, or the error, of each file.
+    """
+    os.makedirs(destination_dir, exist_ok=True)
+    sources = sorted(glob.glob(os.path.join(source_dir, pattern)))
+    jobs = [(source, os.path.join(destination_dir, os.path.basename(source))) for source in sources]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return dict(zip(sources, executor.map(transcode_file, jobs)))
@@ -0,0 +1,234 @@
+"""Tweet parsing: JSON decoder backends, streaming and parallel readers."""
+
+import bz2
+import csv
+import gzip
+import html
+import json
+import lzma
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from .profiling import profiler
+
+
+def tweet_parser(tweet_object, loads=json.loads):
+    """Return ``(screen_name, text)`` for a tweet, with the full text of retweets and extended tweets."""
+    tweet = loads(tweet_object)
+    if 'retweeted_status' in tweet:
+        if 'extended_tweet' in tweet['retweeted_status']:
+            text = tweet['retweeted_status']['extended_tweet']['full_text']
+        else:
+            text = tweet['retweeted_status']['text']
+    else:
+        if 'extended_tweet' in tweet:
+            text = tweet['extended_tweet']['full_text']
+        else:
+            text = tweet['text']
+    user = tweet['user']['screen_name']
+    return (user, text)
+
+
+def get_json_loads(backend=None):
+    """Return the decoder named by ``backend``, or the fastest one installed: simdjson, orjson or json."""
+    if backend in (None, 'simdjson'):
+        try:
+            import simdjson
+            # The parser reuses its buffer: a document is only valid until the next call.
+            return simdjson.Parser().parse
+        except ImportError:
+            if backend is not None:
+                raise
+    if backend in (None, 'orjson'):
+        try:
+            import orjson
+            return orjson.loads
+        except ImportError:
+            if backend is not None:
+                raise
+    return json.loads
+
+
+def detect_compression(path):
+    """Return 'gzip', 'bz2' or 'xz' from the magic number of the file, or None."""
+    with open(path, 'rb') as f:
+        magic = f.read(6)
+    if magic.startswith(b'\x1f\x8b'):
+        return 'gzip'
+    if magic.startswith(b'BZh'):
+        return 'bz2'
+    if magic == b'\xfd7zXZ\x00':
+        return 'xz'
+    return None
+
+
+def open_compressed(path, buffer_size=1024*1024):
+    """Open ``path`` for binary reading, decompressing gzip, bz2 and xz files on the fly."""
+    compression = detect_compression(path)
+    if compression == 'gzip':
+        return gzip.open(path, 'rb')
+    if compression == 'bz2':
+        return bz2.open(path, 'rb')
+    if compression == 'xz':
+        return lzma.open(path, 'rb')
+    return open(path, 'rb', buffering=buffer_size)
+
+
+def iter_tweet_batches(path, batch_size=1000, loads=json.loads):
+    """Yield lists of up to ``batch_size`` parsed tweets, reading the file line by line."""
+    loads = profiler.instrument(loads, 'json.loads')
+    batch = []
+    with open_compressed(path) as f:
+        for line in f:
+            if line.strip():
+                with profiler.stage('tweet_parser', len(line)):
+                    batch.append(tweet_parser(line, loads=loads))
+                if len(batch) == batch_size:
+                    yield batch
+                    batch = []
+    if batch:
+        yield batch
+
+
+class RetweetStore:
+    """Parse tweets, keeping the text of each retweeted tweet only once.
+
+    ``parse`` returns ``(screen_name, text, retweet_of)``.  For a retweet,
+    text is None and retweet_of is the id of the original tweet, whose
+    unescaped text is added to ``new_texts`` the first time it is seen.  The
+    html.unescape results are cached for texts that come back under another id.
+    """
+
+    def __init__(self, loads=json.loads, cache_size=65536):
+        from functools import lru_cache
+        self.loads = loads
+        self.seen = set()
+        self.new_texts = []
+        self.unescape = lru_cache(maxsize=cache_size)(html.unescape)
+
+    def parse(self, tweet_object):
+        tweet = self.loads(tweet_object)
+        user = tweet['user']['screen_name']
+        if 'retweeted_status' in tweet:
+            status = tweet['retweeted_status']
+            status_id = status['id']
+            if status_id not in self.seen:
+                self.seen.add(status_id)
+                if 'extended_tweet' in status:
+                    text = status['extended_tweet']['full_text']
+                else:
+                    text = status['text']
+                self.new_texts.append((status_id, self.unescape(text)))
+            return (user, None, status_id)
+        if 'extended_tweet' in tweet:
+            text = tweet['extended_tweet']['full_text']
+        else:
+            text = tweet['text']
+        return (user, self.unescape(text), None)
+
+    def drain(self):
+        """Return the texts seen since the last call, as ``(id, text)`` pairs."""
+        texts = self.new_texts
+        self.new_texts = []
+        return texts
+
+
+def parse_tweets_deduplicated(path, output, texts_output, loads=None, drain_every=10000):
+    """Write ``(user, tweet, retweet_of)`` rows to ``output``, and each retweeted text once to ``texts_output``.
+
+    Both files can be .csv, .feather or .parquet.  The retweeted texts are
+    written every ``drain_every`` lines, so that they are not all kept in
+    memory.  Returns the number of tweets and the number of distinct
+    retweeted texts.
+    """
+    from .columnar import RowWriter
+
+    tweet_schema = texts_schema = None
+    if not output.endswith('.csv') or not texts_output.endswith('.csv'):
+        import pyarrow as pa
+        # Explicit types: a batch can have no retweets, or only retweets.
+        tweet_schema = pa.schema([('user', pa.string()), ('tweet', pa.string()), ('retweet_of', pa.int64())])
+        texts_schema = pa.schema([('id', pa.int64()), ('tweet', pa.string())])
+    store = RetweetStore(loads or get_json_loads())
+    parse = profiler.instrument(store.parse, 'tweet_parser')
+
+    with RowWriter(output, ('user', 'tweet', 'retweet_of'), tweet_schema) as tweets, \
+            RowWriter(texts_output, ('id', 'tweet'), texts_schema) as texts:
+
+        def rows():
+            with open_compressed(path) as f:
+                for i, line in enumerate(f, 1):
+                    if line.strip():
+                        yield parse(line)
+                    if i % drain_every == 0:
+                        texts.write(store.drain())
+
+        ntweets = tweets.write(rows())
+        texts.write(store.drain())
+    return ntweets, texts.nrows
+
+
+def line_aligned_chunks(path, chunk_size=32*1024*1024):
+    """Yield ``(start, end)`` byte ranges of about ``chunk_size`` bytes that end on a newline."""
+    size = os.path.getsize(path)
+    with open(path, 'rb') as f:
+        start = 0
+        while start < size:
+            f.seek(min(start + chunk_size, size))
+            f.readline()
+            end = f.tell()
+            yield start, end
+            start = end
+
+
+def parse_chunk(path, start, end, backend=None):
+    """Parse and unescape the tweets between two byte offsets of an uncompressed file."""
+    loads = profiler.instrument(get_json_loads(backend), 'json.loads')
+    unescape = profiler.instrument(html.unescape, 'html.unescape')
+    with open(path, 'rb') as f, profiler.stage('read', end - start):
+        f.seek(start)
+        data = f.read(end - start)
+    tweets = []
+    for line in data.splitlines():
+        if line.strip():
+            with profiler.stage('tweet_parser', len(line)):
+                user, text = tweet_parser(line, loads=loads)
+            tweets.append((user, unescape(text)))
+    return tweets
+
+
+def iter_parsed_chunks(path, workers=None, chunk_size=32*1024*1024, max_pending=None, backend=None):
+    """Parse the chunks of ``path`` in a process pool and yield their tweets in file order.
+
+    At most ``max_pending`` chunks are in flight at any time.
+    """
+    workers = workers or os.cpu_count()
+    max_pending = max_pending or 2 * workers
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for start, end in line_aligned_chunks(path, chunk_size):
+            pending.append(executor.submit(parse_chunk, path, start, end, backend))
+            if len(pending) >= max_pending:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def parse_tweets_parallel(path, output, workers=None, chunk_size=32*1024*1024, max_pending=None,
+                          backend=None, file_format='csv'):
+    """Parse an uncompressed JSONL file in parallel and write ``(user, tweet)`` rows in input order."""
+    chunks = iter_parsed_chunks(path, workers, chunk_size, max_pending, backend)
+    if file_format == 'csv':
+        ntweets = 0
+        with open(output, 'w', encoding='utf-8', newline='') as fout:
+            writer = csv.writer(fout)
+            writer.writerow(('user','tweet'))
+            for tweets in chunks:
+                with profiler.stage('csv.writerows'):
+                    writer.writerows(tweets)
+                ntweets += len(tweets)
+        return ntweets
+    from .columnar import write_batches
+    rows = (tweet for tweets in chunks for tweet in tweets)
+    return write_batches(rows, output, ('user', 'tweet'), file_format=file_format)
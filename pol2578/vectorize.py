@@ -0,0 +1,162 @@
+"""Streaming document-term matrices, written in chunks of sparse rows.
+
+The documents are read from any iterable (a generator of speeches or tweet
+texts), ``chunk_size`` at a time, and each chunk becomes a scipy CSR matrix
+saved to its own .npz file.  Only one chunk is in memory at a time.
+
+The columns of the matrix are given by one of two modes.  With feature
+hashing, the column of a word is a stable hash of the word (zlib.crc32,
+unlike hash(), is the same in every process) modulo ``n_features``: no
+vocabulary is stored, and two words can share a column.  With a frozen
+vocabulary, a dictionary of word -> column built beforehand with
+``build_vocabulary``, the words that are not in it are ignored.
+
+In both modes, the column of a word does not depend on the other documents.
+Chunks made by different processes therefore line up, and ``merge_chunks``
+stacks them into one matrix.
+"""
+
+import glob
+import os
+import zlib
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+
+def build_vocabulary(documents, min_count=1, max_size=None, tokenize=str.split):
+    """Return a frozen vocabulary, word -> column, of the words seen at least ``min_count`` times.
+
+    The most frequent words get the first columns; with ``max_size``, only
+    that many words are kept.
+    """
+    counts = Counter()
+    for document in documents:
+        counts.update(tokenize(document))
+    words = [word for word, count in counts.most_common(max_size) if count >= min_count]
+    return {word: column for column, word in enumerate(words)}
+
+
+class StreamingVectorizer:
+    """Count the words of documents into CSR matrices, with feature hashing or a frozen vocabulary.
+
+    ``preprocess`` is applied to each document before it is split with
+    ``tokenize``: a TextPipeline, for instance.  Both must be module-level
+    functions (or TextPipelines) to be sent to other processes.
+    """
+
+    def __init__(self, vocabulary=None, n_features=2**20, preprocess=None, tokenize=str.split):
+        self.vocabulary = vocabulary
+        self.n_features = len(vocabulary) if vocabulary is not None else n_features
+        self.preprocess = preprocess
+        self.tokenize = tokenize
+
+    def columns(self, words):
+        """Return the column of each word as a numpy array, -1 for words outside the vocabulary."""
+        import numpy as np
+        if self.vocabulary is not None:
+            get = self.vocabulary.get
+            return np.fromiter((get(word, -1) for word in words), dtype=np.int64, count=len(words))
+        n_features = self.n_features
+        return np.fromiter((zlib.crc32(word.encode('utf-8')) % n_features for word in words),
+                           dtype=np.int64, count=len(words))
+
+    def transform(self, documents):
+        """Return the CSR matrix of a list of documents, one row per document."""
+        import numpy as np
+        import pandas as pd
+        from scipy import sparse
+
+        tokens = []
+        lengths = []
+        for document in documents:
+            if self.preprocess is not None:
+                document = self.preprocess(document)
+            words = self.tokenize(document)
+            tokens.extend(words)
+            lengths.append(len(words))
+        # Each distinct word of the chunk is hashed (or looked up) once.
+        codes, words = pd.factorize(np.array(tokens, dtype=object))
+        columns = self.columns(words)[codes]
+        rows = np.repeat(np.arange(len(lengths)), lengths)
+        known = columns >= 0
+        counts = np.ones(known.sum(), dtype=np.int32)
+        matrix = sparse.csr_matrix((counts, (rows[known], columns[known])),
+                                   shape=(len(lengths), self.n_features))
+        # The repeated (document, word) pairs are summed by the conversion from
+        # coordinates; sum_duplicates() also sorts the columns of each row.
+        matrix.sum_duplicates()
+        return matrix
+
+    def write_chunks(self, documents, directory, chunk_size=10000, prefix='part'):
+        """Write the matrices of ``documents``, ``chunk_size`` rows at a time, and return their paths.
+
+        The chunks are named ``{prefix}-00000.npz``, ``{prefix}-00001.npz``, ...
+        in ``directory``.
+        """
+        from scipy import sparse
+
+        os.makedirs(directory, exist_ok=True)
+        paths = []
+        documents = iter(documents)
+        while True:
+            chunk = []
+            for document in documents:
+                chunk.append(document)
+                if len(chunk) == chunk_size:
+                    break
+            if not chunk:
+                break
+            path = os.path.join(directory, f"{prefix}-{len(paths):05d}.npz")
+            sparse.save_npz(path, self.transform(chunk))
+            paths.append(path)
+            if len(chunk) < chunk_size:
+                break
+        return paths
+
+
+def merge_chunks(paths):
+    """Stack the chunk files (a list, or a directory of .npz files in name order) into one CSR matrix."""
+    from scipy import sparse
+
+    if isinstance(paths, str):
+        paths = sorted(glob.glob(os.path.join(paths, '*.npz')))
+    matrices = [sparse.load_npz(path) for path in paths]
+    if len({matrix.shape[1] for matrix in matrices}) > 1:
+        raise ValueError("The chunks were made with different numbers of columns.")
+    return sparse.vstack(matrices, format='csr')
+
+
+def speech_texts(path):
+    from .speeches import iter_speeches
+    for speaker, speech in iter_speeches(path):
+        yield speech
+
+
+def tweet_texts(path):
+    import html
+    from .tweets import get_json_loads, iter_tweet_batches
+    for batch in iter_tweet_batches(path, loads=get_json_loads()):
+        for user, text in batch:
+            yield html.unescape(text)
+
+
+def file_texts(path):
+    """The texts of a file: speeches for xml files, tweets for the others."""
+    return speech_texts(path) if path.endswith('.xml') else tweet_texts(path)
+
+
+def vectorize_file(vectorizer, path, directory, chunk_size=10000, texts=file_texts):
+    prefix = os.path.splitext(os.path.basename(path))[0]
+    return vectorizer.write_chunks(texts(path), directory, chunk_size, prefix)
+
+
+def vectorize_files(paths, directory, vectorizer, chunk_size=10000, texts=file_texts, workers=None):
+    """Write the chunks of each file in a process pool, and return their paths, in the order of ``paths``.
+
+    ``texts`` is a module-level function that yields the documents of a
+    file.  The chunks of a file are prefixed with its name without its
+    extension, which must differ between the files.
+    """
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(vectorize_file, vectorizer, path, directory, chunk_size, texts) for path in paths]
+        return [chunk for future in futures for chunk in future.result()]
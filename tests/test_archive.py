@@ -0,0 +1,72 @@
+import json
+import os
+
+from pol2578.archive import TweetIndex
+
+START = 1500000000
+
+
+def tweet_line(tweet_id, user, seconds):
+    tweet = {'id': tweet_id, 'user': {'screen_name': user}, 'text': f'tweet {tweet_id}',
+             'timestamp_ms': str((START + seconds) * 1000)}
+    return (json.dumps(tweet) + '\n').encode('utf-8')
+
+
+def ids(lines):
+    return [json.loads(line)['id'] for line in lines]
+
+
+def test_append_and_rewrite(tmp_path):
+    path = str(tmp_path / 'tweets.jsonl')
+    with open(path, 'wb') as f:
+        f.write(tweet_line(1, 'alice', 0) + tweet_line(2, 'bob', 10) + b'{"delete": {}}\n')
+        # The last line is still being written.
+        f.write(tweet_line(3, 'alice', 20)[:30])
+    with TweetIndex(path) as index:
+        assert index.update() == 2
+        assert len(index) == 2
+        assert index.get(3) is None
+        assert ids([index.get(1)]) == [1]
+
+        with open(path, 'ab') as f:
+            f.write(tweet_line(3, 'alice', 20)[30:] + tweet_line(4, 'Alice', 30))
+        assert index.update() == 2
+        assert len(index) == 4
+        assert ids([index.get(3)]) == [3]
+        assert ids(index.by_user('alice')) == [1, 3, 4]
+        assert ids(index.between(START + 10, START + 30)) == [2, 3]
+        # Nothing new.
+        assert index.update() == 0
+        assert len(index) == 4
+
+        # Shorter file: the index is rebuilt.
+        with open(path, 'wb') as f:
+            f.write(tweet_line(5, 'carol', 40))
+        assert index.update() == 1
+        assert len(index) == 1
+        assert index.get(1) is None
+        assert ids([index.get(5)]) == [5]
+
+        # Same size or longer, but different first bytes: rebuilt too.
+        with open(path, 'wb') as f:
+            f.write(tweet_line(6, 'dave', 50) + tweet_line(7, 'dave', 60))
+        assert index.update() == 2
+        assert len(index) == 2
+        assert index.get(5) is None
+        assert ids(index.by_user('dave')) == [6, 7]
+        assert list(index.by_user('carol')) == []
+
+        # Replaced by a new file, as editors and downloads do.
+        with open(path + '.new', 'wb') as f:
+            f.write(tweet_line(8, 'erin', 70) + tweet_line(9, 'erin', 80) + tweet_line(10, 'dave', 90))
+        os.replace(path + '.new', path)
+        assert index.update() == 3
+        assert ids(index.by_user('dave')) == [10]
+        assert ids([index.get(9)]) == [9]
+
+    # The index is saved next to the archive, and reopened as it was.
+    assert os.path.exists(path + '.index.sqlite')
+    with TweetIndex(path) as index:
+        assert len(index) == 3
+        assert index.update() == 0
+        assert ids(index.between(START + 75)) == [9, 10]
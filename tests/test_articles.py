@@ -0,0 +1,14 @@
+import pytest
+
+pytest.importorskip('lxml')
+
+from pol2578.articles import extract_article, extract_articles
+
+
+def test_utf8_page_without_charset(tmp_path):
+    path = tmp_path / 'page.html'
+    path.write_bytes('<html><body><article><p>Câmara dos Deputados</p></article></body></html>'.encode('utf-8'))
+    assert extract_article(str(path)) == ['Câmara dos Deputados']
+    records, errors = extract_articles(str(tmp_path), kernel=extract_article, workers=1)
+    assert errors == []
+    assert records[0][1] == ['Câmara dos Deputados']
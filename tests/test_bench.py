@@ -0,0 +1,44 @@
+import json
+import os
+
+import pytest
+
+from pol2578.bench import compare_benchmarks
+
+
+def write_results(path, items_per_second, **meta):
+    meta = {'scale': 2, 'xml_copies': 10, 'python': '3.11.4', 'platform': 'Linux', **meta}
+    result = {'items_per_second': items_per_second, 'latency_ms': {'p99': 1.0}, 'rss_increase_mb': 10.0}
+    with open(path, 'w', encoding='utf-8') as fout:
+        json.dump({'meta': meta, 'results': {'tweets': result}}, fout)
+    return str(path)
+
+
+def test_regression(tmp_path):
+    old = write_results(tmp_path / 'old.json', 1000)
+    new = write_results(tmp_path / 'new.json', 800)
+    assert compare_benchmarks(old, new) == [('tweets', 'items_per_second', 1000, 800)]
+    assert compare_benchmarks(old, new, tolerance=0.3) == []
+
+
+def test_different_conditions(tmp_path):
+    old = write_results(tmp_path / 'old.json', 1000)
+    new = write_results(tmp_path / 'new.json', 1000, scale=10)
+    with pytest.raises(ValueError, match='scale'):
+        compare_benchmarks(old, new)
+    with pytest.warns(UserWarning, match='scale'):
+        assert compare_benchmarks(old, new, strict=False) == []
+
+
+def test_cli_compare_with_output_file(tmp_path, monkeypatch):
+    import platform
+    from pol2578.cli import main
+
+    samples = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    monkeypatch.chdir(tmp_path)
+    # The baseline is the output file too: it must be read before it is overwritten.
+    write_results(tmp_path / 'benchmarks.json', 1e12, scale=1, python=platform.python_version(),
+                  platform=platform.platform())
+    with pytest.raises(SystemExit) as exit:
+        main(['bench', '--scale', '1', '--names', 'tweets', '--samples', samples, '--compare', 'benchmarks.json'])
+    assert exit.value.code == 1
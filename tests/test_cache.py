@@ -0,0 +1,92 @@
+import os
+import shutil
+
+from pol2578.cache import ExtractionCache
+
+calls = []
+
+
+def count_words(path, separator=None):
+    calls.append(path)
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            yield len(line.split(separator))
+
+
+def test_hits_follow_the_content(tmp_path):
+    calls.clear()
+    source = tmp_path / 'a.txt'
+    source.write_text('one two\nthree\n', encoding='utf-8')
+    cache = ExtractionCache(str(tmp_path / 'cache'))
+    assert cache(count_words, str(source)) == [2, 1]
+    assert cache(count_words, str(source)) == [2, 1]
+    # A copy has the same content, so the same entry.
+    shutil.copy(source, tmp_path / 'b.txt')
+    assert cache(count_words, str(tmp_path / 'b.txt')) == [2, 1]
+    assert (cache.hits, cache.misses) == (2, 1)
+    # Other arguments, another version or another content make new entries.
+    assert cache(count_words, str(source), 'w') == [2, 1]
+    assert cache(count_words, str(source), version='2') == [2, 1]
+    source.write_text('one two three\n', encoding='utf-8')
+    assert cache(count_words, str(source)) == [3]
+    assert len(calls) == 4
+    assert len(cache) == 4
+
+
+def read_text(path):
+    with open(path, encoding='utf-8') as f:
+        return f.read()
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    paths = []
+    for i in range(4):
+        path = tmp_path / f'{i}.txt'
+        path.write_text(f'{i} ' * 1000, encoding='utf-8')
+        paths.append(str(path))
+    cache = ExtractionCache(str(tmp_path / 'cache'))
+    cached_read = cache.wrap(read_text)
+    for path in paths[:3]:
+        cached_read(path)
+    # The first entry becomes the most recently used, and the second one is evicted.
+    cached_read(paths[0])
+    cache.max_size = cache.size
+    cached_read(paths[3])
+    assert len(cache) == 3
+    assert cache.size <= cache.max_size
+    assert (cache.hits, cache.misses) == (1, 4)
+    cached_read(paths[0])
+    cached_read(paths[1])
+    assert (cache.hits, cache.misses) == (2, 5)
+
+
+def test_edited_extractor(tmp_path):
+    source = tmp_path / 'a.txt'
+    source.write_text('one two\nthree\n', encoding='utf-8')
+    cache = ExtractionCache(str(tmp_path / 'cache'))
+    namespace = {}
+    exec("def extract(path):\n    with open(path) as f:\n        return len(f.read().split())", namespace)
+    assert cache(namespace['extract'], str(source)) == 3
+    # Same name, module and version, but another body.
+    exec("def extract(path):\n    with open(path) as f:\n        return len(f.read().splitlines())", namespace)
+    assert cache(namespace['extract'], str(source)) == 2
+    assert (cache.hits, cache.misses) == (0, 2)
+    exec("def extract(path):\n    with open(path) as f:\n        return len(f.read().splitlines())", namespace)
+    assert cache(namespace['extract'], str(source)) == 2
+    assert cache.hits == 1
+
+
+def test_code_digest_is_stable_across_processes():
+    import subprocess
+    import sys
+
+    code = ("from pol2578.cache import code_digest\n"
+            "def f(word):\n    return word in {'alpha', 'beta', 'gamma', 'delta'}, [w for w in ('x', 'y')]\n"
+            "print(code_digest(f))")
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    digests = set()
+    for seed in ('1', '2', '3'):
+        env = dict(os.environ, PYTHONHASHSEED=seed, PYTHONPATH=root)
+        digests.add(subprocess.run([sys.executable, '-c', code], env=env, capture_output=True,
+                                   text=True, check=True).stdout)
+    assert len(digests) == 1
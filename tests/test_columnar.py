@@ -0,0 +1,35 @@
+import pytest
+
+pa = pytest.importorskip('pyarrow')
+pq = pytest.importorskip('pyarrow.parquet')
+
+from pol2578.columnar import write_batches, write_rows
+
+
+def test_all_none_first_batch(tmp_path):
+    rows = [('a', None), ('b', None), ('c', 'text'), ('d', None)]
+    for extension in ('parquet', 'feather'):
+        path = str(tmp_path / f'rows.{extension}')
+        write_batches(rows, path, ('user', 'tweet'), batch_size=2, file_format=extension)
+        if extension == 'parquet':
+            table = pq.read_table(path)
+        else:
+            with pa.memory_map(path) as source:
+                table = pa.ipc.open_file(source).read_all()
+        assert table.schema.field('tweet').type == pa.string()
+        assert table.column('tweet').to_pylist() == [None, None, 'text', None]
+
+
+def test_write_rows_all_none_column(tmp_path):
+    path = str(tmp_path / 'rows.parquet')
+    assert write_rows([('a', None), ('b', None)], path, ('user', 'tweet')) == 2
+    assert pq.read_table(path).schema.field('tweet').type == pa.string()
+
+
+def test_explicit_schema(tmp_path):
+    schema = pa.schema([('user', pa.string()), ('retweet_of', pa.int64())])
+    path = str(tmp_path / 'rows.parquet')
+    write_batches([('a', None), ('b', 7)], path, schema.names, schema=schema, batch_size=1)
+    table = pq.read_table(path)
+    assert table.schema == schema
+    assert table.column('retweet_of').to_pylist() == [None, 7]
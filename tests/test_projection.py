@@ -0,0 +1,74 @@
+import html
+import json
+import os
+
+import pytest
+
+pa = pytest.importorskip('pyarrow')
+
+from pol2578.projection import TWEET_FIELDS, TweetProjection
+from pol2578.tweets import get_json_loads, tweet_parser
+
+SAMPLE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'tweets-sample.txt')
+
+
+def test_text_and_user_match_tweet_parser():
+    with open(SAMPLE, 'rb') as f:
+        expected = [tweet_parser(line) for line in f if line.strip()]
+    for backend in ('json', 'orjson', 'simdjson'):
+        try:
+            loads = get_json_loads(backend)
+        except ImportError:
+            continue
+        table = TweetProjection().read(SAMPLE, loads=loads)
+        assert table.column('user').to_pylist() == [user for user, text in expected]
+        assert table.column('text').to_pylist() == [html.unescape(text) for user, text in expected]
+
+
+def test_typed_columns():
+    table = TweetProjection().read(SAMPLE)
+    assert table.schema.field('id').type == pa.int64()
+    assert table.schema.field('created_at').type == pa.timestamp('ms', tz='UTC')
+    assert table.schema.field('hashtags').type == pa.list_(pa.string())
+    assert table.column('urls').to_pylist()[0] == ['https://youtu.be/m-L-avS-eXQ']
+
+
+def test_fallbacks_and_skipped_lines(tmp_path):
+    tweets = [
+        {'id': 1, 'created_at': 'Tue Sep 20 20:51:37 +0000 2016', 'text': 'short &amp; sweet',
+         'extended_tweet': {'full_text': 'long &amp; sweet', 'entities': {'hashtags': [{'text': 'long'}]}},
+         'entities': {'hashtags': [{'text': 'short'}]}, 'user': {'screen_name': 'a'}},
+        {'id': 2, 'text': 'RT', 'user': {'screen_name': 'b'}, 'entities': {'hashtags': []},
+         'retweeted_status': {'id': 1, 'text': 'original', 'entities': {'hashtags': [{'text': 'x'}]}}},
+        {'delete': {'status': {'id': 3}}},
+        {'id': 4, 'user': None, 'in_reply_to_status_id': 1, 'timestamp_ms': '1474404697000'},
+    ]
+    path = tmp_path / 'tweets.txt'
+    path.write_text('\n'.join(json.dumps(tweet) for tweet in tweets) + '\n{not json\n', encoding='utf-8')
+    table = TweetProjection().read(str(path))
+    rows = table.to_pylist()
+    assert [row['id'] for row in rows] == [1, 2, 4]
+    assert [row['text'] for row in rows] == ['long & sweet', 'original', None]
+    assert [row['hashtags'] for row in rows] == [['long'], ['x'], None]
+    assert [row['retweet_of'] for row in rows] == [None, 1, None]
+    assert [row['user'] for row in rows] == ['a', 'b', None]
+    assert rows[0]['created_at'].timestamp() == 1474404697
+    assert rows[2]['created_at'].timestamp() == 1474404697
+    assert rows[2]['in_reply_to_status_id'] == 1
+
+
+def test_write_parquet_in_batches(tmp_path):
+    pq = pytest.importorskip('pyarrow.parquet')
+    projection = TweetProjection([field for field in TWEET_FIELDS if field[0] in ('id', 'user', 'mentions')])
+    output = str(tmp_path / 'fields.parquet')
+    assert projection.write(SAMPLE, output, batch_size=2) == 5
+    table = pq.read_table(output)
+    assert table.column_names == ['id', 'user', 'mentions']
+    assert pq.ParquetFile(output).num_row_groups == 3
+
+
+def test_invalid_spec():
+    with pytest.raises(ValueError):
+        TweetProjection([('id', 'id', 'integer')])
+    with pytest.raises(ValueError):
+        TweetProjection([('user', 'user.screen_name', 'string')])
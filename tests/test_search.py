@@ -0,0 +1,118 @@
+import os
+
+import pytest
+
+np = pytest.importorskip('numpy')
+pytest.importorskip('pandas')
+pytest.importorskip('pyarrow')
+pytest.importorskip('lxml')
+
+from pol2578.search import SpeechIndex, decode_varints, encode_varints, tokenize
+from pol2578.speeches import SpeechTable, read_speeches
+
+SAMPLE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'uk.proc.d.2013-12-11.xml')
+
+
+@pytest.fixture(scope='module')
+def speeches():
+    return read_speeches(SAMPLE)
+
+
+@pytest.fixture(scope='module')
+def index(speeches, tmp_path_factory):
+    # Three segments of unequal sizes.
+    directory = str(tmp_path_factory.mktemp('index'))
+    index = SpeechIndex(directory)
+    for start, end in ((0, 100), (100, 250), (250, len(speeches))):
+        table = SpeechTable()
+        for column in table.columns:
+            table.data[column] = speeches.data[column][start:end]
+        index.add(table)
+    return index
+
+
+def brute_phrase(speeches, phrase):
+    words = tokenize(phrase)
+    docs = []
+    for doc, text in enumerate(speeches.data['text']):
+        tokens = tokenize(text)
+        if any(tokens[i:i + len(words)] == words for i in range(len(tokens) - len(words) + 1)):
+            docs.append(doc)
+    return docs
+
+
+def test_varint_round_trip():
+    values = np.array([0, 1, 127, 128, 300, 2**14, 2**32 + 5, 2**56, 2**63 - 1, 2**63, 2**64 - 1], dtype=np.uint64)
+    encoded = encode_varints(values)
+    assert encoded.dtype == np.uint8
+    assert len(encode_varints([2**64 - 1])) == 10
+    assert decode_varints(encoded).tolist() == values.tolist()
+    assert decode_varints(encode_varints([5, 0, 127])).tolist() == [5, 0, 127]
+    assert decode_varints(encode_varints(np.zeros(0, dtype=np.uint64))).tolist() == []
+
+
+def test_segments(index, speeches):
+    assert len(index.segments) == 3
+    assert len(index) == len(speeches)
+    # The phrase tests need matches in every segment.
+    docs = brute_phrase(speeches, 'the government')
+    assert min(docs) < 100 and any(100 <= doc < 250 for doc in docs) and max(docs) >= 250
+
+
+@pytest.mark.parametrize('phrase', ['the government', 'the right hon gentleman', 'banking system',
+                                    'point of order', 'my hon friend', 'house'])
+def test_phrases(index, speeches, phrase):
+    expected = brute_phrase(speeches, phrase)
+    assert expected
+    assert index.phrase(tokenize(phrase)).tolist() == expected
+    assert index.search(f'"{phrase}"').tolist() == expected
+
+
+def test_missing_phrase(index):
+    assert index.search('"banking government banking"').tolist() == []
+    assert index.search('nonexistentword').tolist() == []
+
+
+def test_boolean_queries(index, speeches):
+    def docs(query):
+        return set(index.search(query).tolist())
+
+    everything = set(range(len(speeches)))
+    banking = set(brute_phrase(speeches, 'banking'))
+    system = set(brute_phrase(speeches, 'system'))
+    agree = set(brute_phrase(speeches, 'agree'))
+    order = set(brute_phrase(speeches, 'point of order'))
+    assert docs('banking system') == banking & system
+    assert docs('banking AND system') == banking & system
+    assert docs('banking OR agree') == banking | agree
+    assert docs('banking NOT system') == banking - system
+    assert docs('NOT banking') == everything - banking
+    assert docs('NOT NOT banking') == banking
+    # AND binds tighter than OR.
+    assert docs('agree OR banking system') == agree | (banking & system)
+    assert docs('(agree OR banking) system') == (agree | banking) & system
+    assert docs('("point of order" OR agree) NOT (banking OR system)') == (order | agree) - (banking | system)
+    assert index.search('BANKING').tolist() == sorted(banking)
+
+
+def test_filters(index, speeches):
+    banking = brute_phrase(speeches, 'banking')
+    expected = [doc for doc in banking if speeches.data['party'][doc] == 'Labour']
+    assert index.search('banking', party='Labour').tolist() == expected
+    assert index.metadata(expected)['party'].eq('Labour').all()
+
+
+@pytest.mark.parametrize('query', ['banking AND', 'banking OR', 'NOT', '(banking', 'banking)', 'OR banking',
+                                   '()', ''])
+def test_malformed_queries(index, query):
+    with pytest.raises(ValueError):
+        index.search(query)
+
+
+def test_reopen(index, speeches):
+    reopened = SpeechIndex(index.directory)
+    assert len(reopened.segments) == 3
+    assert reopened.vocabulary == index.vocabulary
+    for query in ('"the government"', 'banking NOT system', '(agree OR banking) system'):
+        assert reopened.search(query).tolist() == index.search(query).tolist()
+    assert reopened.metadata()['id'].tolist() == speeches.data['id']
@@ -0,0 +1,28 @@
+import os
+
+import pytest
+
+pytest.importorskip('lxml')
+
+from pol2578.speeches import SpeechTable, read_speeches
+
+SAMPLE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'uk.proc.d.2013-12-11.xml')
+
+
+def test_categorical_columns():
+    table = read_speeches(SAMPLE)
+    df = table.to_pandas()
+    for column in SpeechTable.categorical:
+        assert df[column].dtype == 'category'
+    assert df['party'].cat.categories.size < len(df)
+    assert df['party'].isna().tolist() == [party is None for party in table.data['party']]
+
+
+def test_arrow_dictionaries():
+    pa = pytest.importorskip('pyarrow')
+    table = read_speeches(SAMPLE)
+    arrow = table.to_arrow()
+    assert arrow.column_names == list(SpeechTable.columns)
+    assert pa.types.is_dictionary(arrow.schema.field('party').type)
+    assert pa.types.is_string(arrow.schema.field('text').type)
+    assert arrow.column('party').to_pylist() == table.data['party']
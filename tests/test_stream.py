@@ -0,0 +1,57 @@
+import asyncio
+import csv
+import html
+import os
+
+import pytest
+
+from pol2578.stream import consume, start_replay_server
+from pol2578.tweets import tweet_parser
+
+SAMPLE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'tweets-sample.txt')
+
+
+def expected_rows(repeat):
+    with open(SAMPLE, 'rb') as f:
+        rows = [tweet_parser(line) for line in f if line.strip()]
+    return [(user, html.unescape(text)) for user, text in rows] * repeat
+
+
+async def replay_and_consume(output, repeat, unix=None, rate=None, **kwargs):
+    server = await start_replay_server(SAMPLE, unix=unix, repeat=repeat, rate=rate)
+    source = f'unix:{unix}' if unix else 'tcp://127.0.0.1:%d' % server.sockets[0].getsockname()[1]
+    async with server:
+        return await consume(source, output, workers=2, **kwargs)
+
+
+def test_tcp_replay_to_csv(tmp_path):
+    output = str(tmp_path / 'tweets.csv')
+    stats = asyncio.run(replay_and_consume(output, repeat=400, batch_size=100))
+    with open(output, encoding='utf-8', newline='') as f:
+        rows = [tuple(row) for row in csv.reader(f)]
+    assert rows[0] == ('user', 'tweet')
+    assert rows[1:] == expected_rows(400)
+    assert stats['tweets'] == len(rows) - 1
+    assert stats['batches'] > 1
+    assert stats['max_pending'] <= 4
+
+
+@pytest.mark.skipif(not hasattr(asyncio, 'start_unix_server'), reason='no Unix sockets')
+def test_unix_replay_to_parquet_parts(tmp_path):
+    pd = pytest.importorskip('pandas')
+    pytest.importorskip('pyarrow')
+    output = str(tmp_path / 'tweets.parquet')
+    stats = asyncio.run(replay_and_consume(output, repeat=100, unix=str(tmp_path / 'feed.sock'),
+                                           batch_size=100, part_size=200))
+    parts = sorted(tmp_path.glob('tweets-*.parquet'))
+    assert len(parts) > 1
+    df = pd.concat([pd.read_parquet(part) for part in parts])
+    assert list(df.itertuples(index=False, name=None)) == expected_rows(100)
+    assert stats['tweets'] == len(df)
+
+
+def test_slow_feed_is_flushed_by_time(tmp_path):
+    output = str(tmp_path / 'tweets.csv')
+    stats = asyncio.run(replay_and_consume(output, repeat=60, rate=1000, flush_interval=0.01))
+    assert stats['tweets'] == len(expected_rows(60))
+    assert stats['batches'] > 1
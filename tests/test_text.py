@@ -0,0 +1,70 @@
+import html
+import itertools
+
+import pytest
+
+from pol2578.text import SENTIMENT, TextPipeline, WordFilter, remove_words, score_corpus
+
+TEXTS = ['', '   ', 'Canada', '  I thank the hon. Member &amp; the House of Commons for this bill.  ',
+         'The government&nbsp;and the LAW &#32;of Canada', '&Eacute;cole  publique\t\n', 'ΟΔΟΣ &lt;Canada&gt; bill']
+STAGES = {'lower': str.lower, 'unescape': html.unescape, 'strip': str.strip, 'remove_words': remove_words,
+          'words': WordFilter(['the', 'canada', 'of']), 'phrases': WordFilter(['house of commons', 'hon.', 'the']),
+          'pad': lambda text: f' {text} '}
+
+
+def chained(stages, text):
+    for stage in stages:
+        text = STAGES.get(stage, stage)(text) if isinstance(stage, str) else stage(text)
+    return text
+
+
+def test_same_output_as_chained_calls():
+    for n in range(4):
+        for names in itertools.product(STAGES, repeat=n):
+            stages = [name if name in ('lower', 'unescape', 'strip') else STAGES[name] for name in names]
+            pipeline = TextPipeline(stages)
+            expected = [chained(stages, text) for text in TEXTS]
+            assert [pipeline(text) for text in TEXTS] == expected, pipeline.source
+            assert pipeline.batch(TEXTS) == expected
+
+
+def test_fused_stages():
+    pipeline = TextPipeline([html.unescape, str.lower, remove_words, WordFilter(['the']), str.strip])
+    clean = pipeline.source.split('def batch')[0]
+    assert clean.count('split()') == 1
+    assert clean.count('not in') == 1
+    assert 'strip' not in clean
+
+
+def loop_scores(documents, sentiment):
+    # The loop of the notebook, with nan for the documents without tokens.
+    scores = []
+    for document in documents:
+        tokens = document.split()
+        sentwords = [sentiment.get(word, 0) for word in tokens]
+        if not tokens:
+            scores.append(float('nan'))
+            continue
+        scores.append((sentwords.count('positive') - sentwords.count('negative'))/len(tokens))
+    return scores
+
+
+def test_score_corpus_matches_loop():
+    import random
+    np = pytest.importorskip('numpy')
+    pytest.importorskip('pandas')
+
+    words = list(SENTIMENT) + ['Happy', 'the', 'bill', 'happy.', 'neutral', 'sad']
+    lexicon = dict(SENTIMENT, neutral='neutral')
+    rng = random.Random(0)
+    documents = [' '.join(rng.choice(words) for i in range(rng.randrange(0, 12))) for j in range(50)]
+    documents += ['', '   ', 'happy', 'sad sad happy', '\tjoyful\n']
+    expected = loop_scores(documents, lexicon)
+    assert sum(np.isnan(expected)) >= 2
+    for chunk_size in (1, 2, 7, len(documents) - 1, len(documents), len(documents) + 1, 100000):
+        scores = score_corpus(iter(documents), lexicon, chunk_size=chunk_size)
+        assert scores.shape == (len(documents),)
+        # Exactly the same floats, and nan at the same places.
+        np.testing.assert_array_equal(scores, expected)
+    assert score_corpus([]).tolist() == []
+    assert np.isnan(score_corpus(['']))[0]
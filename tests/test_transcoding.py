@@ -0,0 +1,48 @@
+import pytest
+
+from pol2578.transcoding import transcode, transcode_directory
+
+
+@pytest.mark.parametrize('text', ['A República e a Nação', 'café résumé',
+                                  'Québec, les Trois-Rivières et Montréal', 'l\u2019été, 5 \u20ac'])
+def test_invalid_utf8_after_sample(tmp_path, text):
+    # The first 64 KB are ascii, and thus valid utf-8: the cp1252 bytes come later.
+    text = 'a' * 100000 + '\n' + text + '\n'
+    source = tmp_path / 'source.txt'
+    source.write_bytes(text.encode('cp1252'))
+    destination = tmp_path / 'destination.txt'
+    assert transcode(str(source), str(destination), chunk_size=4096) == 'cp1252'
+    assert destination.read_text(encoding='utf-8') == text
+
+
+def test_latin1_control_bytes_after_sample(tmp_path):
+    # 0x81 is not a cp1252 character.
+    data = b'a' * 100000 + b'\x81 Rep\xfablica'
+    source = tmp_path / 'source.txt'
+    source.write_bytes(data)
+    destination = tmp_path / 'destination.txt'
+    assert transcode(str(source), str(destination)) == 'latin-1'
+    assert destination.read_text(encoding='utf-8') == 'a' * 100000 + '\x81 República'
+
+
+def test_utf8_copied(tmp_path):
+    source = tmp_path / 'source.txt'
+    source.write_text('República\n' * 10000, encoding='utf-8')
+    destination = tmp_path / 'destination.txt'
+    assert transcode(str(source), str(destination), chunk_size=4097) == 'utf-8'
+    assert destination.read_bytes() == source.read_bytes()
+
+
+def test_invalid_given_encoding(tmp_path):
+    source = tmp_path / 'source.txt'
+    source.write_bytes('A República'.encode('latin-1'))
+    with pytest.raises(UnicodeDecodeError):
+        transcode(str(source), str(tmp_path / 'destination.txt'), encoding='utf-8')
+
+
+def test_directory(tmp_path):
+    (tmp_path / 'in').mkdir()
+    (tmp_path / 'in' / 'a.txt').write_bytes(('a' * 70000 + 'A República').encode('latin-1'))
+    results = transcode_directory(str(tmp_path / 'in'), str(tmp_path / 'out'), workers=1)
+    assert results[str(tmp_path / 'in' / 'a.txt')] == 'cp1252'
+    assert (tmp_path / 'out' / 'a.txt').read_text(encoding='utf-8') == 'a' * 70000 + 'A República'
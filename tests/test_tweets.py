@@ -0,0 +1,65 @@
+import json
+import os
+
+import pytest
+
+from pol2578.tweets import get_json_loads, iter_tweet_batches, parse_tweets_deduplicated, tweet_parser
+
+SAMPLE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'tweets-sample.txt')
+
+
+@pytest.mark.parametrize('backend', ['json', 'orjson', 'simdjson'])
+def test_backends_agree(backend):
+    pytest.importorskip(backend)
+    loads = get_json_loads(backend)
+    with open(SAMPLE, 'rb') as f:
+        lines = [line for line in f if line.strip()]
+    # Escaped and astral characters, and an extended retweet.
+    lines.append(rb'{"user": {"screen_name": "\u00e9l\u00e8ve"}, "text": "caf\u00e9 \ud83d\ude00 &amp; \"\\n\""}')
+    lines.append(json.dumps({'user': {'screen_name': 'b'}, 'text': 'RT',
+                             'retweeted_status': {'text': 'short', 'extended_tweet': {'full_text': 'long ü'}}},
+                            ensure_ascii=False).encode('utf-8'))
+    expected = [tweet_parser(line, loads=json.loads) for line in lines]
+    parsed = [tweet_parser(line, loads=loads) for line in lines]
+    assert parsed == expected
+    assert all(type(user) is str and type(text) is str for user, text in parsed)
+    batches = [row for batch in iter_tweet_batches(SAMPLE, batch_size=2, loads=loads) for row in batch]
+    assert batches == expected[:-2]
+
+
+def write_tweets(path, noriginals, nretweets):
+    with open(path, 'w', encoding='utf-8') as f:
+        for i in range(noriginals):
+            f.write(json.dumps({'id': i, 'user': {'screen_name': 'a'}, 'text': f'tweet {i}'}) + '\n')
+        for i in range(nretweets):
+            status = {'id': i % 3, 'user': {'screen_name': 'a'}, 'text': f'tweet {i % 3}'}
+            f.write(json.dumps({'id': 10**6 + i, 'user': {'screen_name': 'b'}, 'text': 'RT',
+                                'retweeted_status': status}) + '\n')
+
+
+def test_deduplicated_first_batch_without_retweets(tmp_path):
+    pq = pytest.importorskip('pyarrow.parquet')
+    import pyarrow as pa
+    # The first record batch (100000 rows) has no retweets: retweet_of is all None.
+    path = str(tmp_path / 'tweets.txt')
+    write_tweets(path, 100000, 5)
+    output, texts_output = str(tmp_path / 'tweets.parquet'), str(tmp_path / 'texts.parquet')
+    assert parse_tweets_deduplicated(path, output, texts_output) == (100005, 3)
+    table = pq.read_table(output)
+    assert table.schema.field('retweet_of').type == pa.int64()
+    assert table.column('retweet_of').to_pylist()[-5:] == [0, 1, 2, 0, 1]
+    assert pq.read_table(texts_output).to_pylist() == [{'id': i, 'tweet': f'tweet {i}'} for i in range(3)]
+
+
+def test_deduplicated_only_retweets(tmp_path):
+    pa = pytest.importorskip('pyarrow')
+    path = str(tmp_path / 'tweets.txt')
+    write_tweets(path, 0, 7)
+    output, texts_output = str(tmp_path / 'tweets.feather'), str(tmp_path / 'texts.csv')
+    assert parse_tweets_deduplicated(path, output, texts_output, drain_every=2) == (7, 3)
+    with pa.memory_map(output) as source:
+        table = pa.ipc.open_file(source).read_all()
+    assert table.schema.field('tweet').type == pa.string()
+    assert table.column('tweet').null_count == 7
+    with open(texts_output, encoding='utf-8') as f:
+        assert f.read().splitlines() == ['id,tweet', '0,tweet 0', '1,tweet 1', '2,tweet 2']
@@ -0,0 +1,55 @@
+import os
+import zlib
+
+import pytest
+
+np = pytest.importorskip('numpy')
+pytest.importorskip('pandas')
+pytest.importorskip('scipy')
+
+from pol2578.vectorize import StreamingVectorizer, build_vocabulary, merge_chunks, vectorize_files
+
+DOCUMENTS = ['the bill of the government', 'Canada', '', 'the law and the bill', 'government government'] * 7
+
+
+def test_vocabulary_counts():
+    vocabulary = build_vocabulary(DOCUMENTS)
+    matrix = StreamingVectorizer(vocabulary).transform(DOCUMENTS)
+    assert matrix.shape == (len(DOCUMENTS), len(vocabulary))
+    assert matrix[0, vocabulary['the']] == 2
+    assert matrix[4, vocabulary['government']] == 2
+    assert matrix[2].nnz == 0
+    assert vocabulary['the'] == 0
+
+
+def test_frozen_vocabulary_ignores_new_words():
+    matrix = StreamingVectorizer({'bill': 0, 'law': 1}).transform(['the bill and the law', 'bill bill'])
+    assert matrix.toarray().tolist() == [[1, 1], [2, 0]]
+
+
+def test_hashing_is_stable():
+    vectorizer = StreamingVectorizer(n_features=64)
+    first = vectorizer.transform(DOCUMENTS)
+    assert first.shape[1] == 64
+    # The column of a word is the same in every process, unlike hash().
+    assert first[1, zlib.crc32(b'Canada') % 64] == 1
+    assert first.sum() == sum(len(document.split()) for document in DOCUMENTS)
+
+
+def test_chunks_merge_to_the_same_matrix(tmp_path):
+    vectorizer = StreamingVectorizer(n_features=1024)
+    paths = vectorizer.write_chunks(iter(DOCUMENTS), str(tmp_path), chunk_size=4)
+    assert len(paths) == 9
+    assert (merge_chunks(str(tmp_path)) != vectorizer.transform(DOCUMENTS)).nnz == 0
+
+
+def test_parallel_files(tmp_path):
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    pytest.importorskip('lxml')
+    vectorizer = StreamingVectorizer(n_features=2**16)
+    paths = [os.path.join(root, 'uk.proc.d.2013-12-11.xml'), os.path.join(root, 'tweets-sample.txt')]
+    chunks = vectorize_files(paths, str(tmp_path), vectorizer, chunk_size=100, workers=2)
+    assert [os.path.basename(chunk) for chunk in chunks][-1] == 'tweets-sample-00000.npz'
+    merged = merge_chunks(chunks)
+    assert merged.shape == (339 + 5, 2**16)
+    assert merged.nnz > 0